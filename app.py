@@ -1,836 +1,1243 @@
 #!/usr/bin/env python
 from threading import Lock
-from flask import Flask, render_template, session, request
-from flask_socketio import SocketIO, emit, disconnect
-import time
+from flask import Flask, render_template, request, g, jsonify
+from flask_socketio import SocketIO, Namespace, emit, disconnect
+import os
 import random
 
+import logging
+from collections import Counter
+from timeit import default_timer
+
+from arq import (DelayScheduler, Duplex, EventLog, OwedAcks, Reassembler, Registry, RtoEstimator, Segmenter,
+                 SessionRegistry, ack_ranges, channel_from_config, store_from_url, wire)
+from arq.checksum import ALGORITHMS as CHECKSUMS, frame_checksum
+from arq.metrics import CONTENT_TYPE
+from arq.payload import generate as generate_payload
+
 # Set this variable to "threading", "eventlet" or "gevent" 
-# I used gevent
-async_mode = None
+# I used gevent. server.py sets ASYNC_MODE after monkey patching
+async_mode = os.environ.get('ASYNC_MODE') or None
+
+# Simulated propagation delay of the middle layer, and gap at which the sender frontend
+# replays the packets of a burst (seconds)
+CHANNEL_DELAY = float(os.environ.get('CHANNEL_DELAY', .05))
+BURST_SPACING = float(os.environ.get('BURST_SPACING', .05))
+# Retransmission timeout, counted from the moment a packet reaches the sender frontend (seconds).
+# It is only the first guess : every connection learns its own from the round trips of its acks,
+# within [RTO_MIN, RTO_MAX], and doubles it on every timeout. See arq/rto.py
+RETRANSMIT_TIMEOUT = float(os.environ.get('RETRANSMIT_TIMEOUT', 2))
+RTO_MIN = float(os.environ.get('RTO_MIN', .2))
+RTO_MAX = float(os.environ.get('RTO_MAX', 10))
+# Width of the packet and ack numbers on the wire, they wrap around at 2^SEQUENCE_BITS.
+# Unset keeps them growing. Windows are cut to 2^k - 1 for go back N, 2^(k-1) otherwise
+SEQUENCE_BITS = int(os.environ['SEQUENCE_BITS']) if os.environ.get('SEQUENCE_BITS') else None
+if SEQUENCE_BITS is not None and not 1 <= SEQUENCE_BITS <= 32:
+    # the binary wire format has 32 bits for them
+    raise ValueError('SEQUENCE_BITS must be within 1 and 32, got %d' % SEQUENCE_BITS)
+# Payload transfer : bytes per frame unless the sender asks for another size (65535 at most),
+# and the largest payload one connection may send
+PAYLOAD_MTU = int(os.environ.get('PAYLOAD_MTU', 1024))
+PAYLOAD_MAX = int(os.environ.get('PAYLOAD_MAX', 16 * 1024 * 1024))
+# Two way transfers : how long an ack waits for a frame going the other way to ride on,
+# before it goes out on its own (seconds). Keep it well below RTO_MIN
+ACK_DELAY = float(os.environ.get('ACK_DELAY', .1))
+# Ack coalescing : go back N and selective repeat receivers ack every ACK_EVERY frames in one
+# message, a cumulative ack or ranges, or once the first of them has waited ACK_DELAY.
+# 1 acks every frame on its own from the receiver frontend. Best kept at or below the window
+ACK_EVERY = int(os.environ.get('ACK_EVERY', 1))
+
+# Channel model of the middle layer, see arq/channel.py. Probabilities, per frame / ack.
+# The defaults match the odds the browser used to roll : 5 in 16 lost, and for go back N and
+# selective repeat 2 in 13 acks corrupted. Stop and wait acks were never corrupted, see
+# ProtocolStrategy.ack_corrupt. CHANNEL_ACK_CORRUPT, when set, applies to every protocol
+# CHANNEL_MODEL : "bernoulli" or "gilbert-elliott", the latter with CHANNEL_GILBERT="p,r,bad_loss"
+# CHANNEL_SEED  : fixed seed for every connection, otherwise ?seed= at connect, otherwise random
+CHANNEL_MODEL = os.environ.get('CHANNEL_MODEL', 'bernoulli')
+CHANNEL_LOSS = float(os.environ.get('CHANNEL_LOSS', .3125))
+CHANNEL_ACK_LOSS = float(os.environ['CHANNEL_ACK_LOSS']) if os.environ.get('CHANNEL_ACK_LOSS') else None
+CHANNEL_CORRUPT = float(os.environ.get('CHANNEL_CORRUPT', 0))
+CHANNEL_ACK_CORRUPT = float(os.environ['CHANNEL_ACK_CORRUPT']) if os.environ.get('CHANNEL_ACK_CORRUPT') else None
+CHANNEL_DUPLICATE = float(os.environ.get('CHANNEL_DUPLICATE', 0))
+CHANNEL_REORDER = float(os.environ.get('CHANNEL_REORDER', 0))
+CHANNEL_GILBERT = tuple(float(x) for x in os.environ['CHANNEL_GILBERT'].split(',')) \
+    if os.environ.get('CHANNEL_GILBERT') else None
+CHANNEL_SEED = int(os.environ['CHANNEL_SEED']) if os.environ.get('CHANNEL_SEED') else None
+# Checksum the middle layer stamps on every frame : "crc32" or "crc16", see arq/checksum.py.
+# The receiver drops a frame that fails it and sends a negative ack. "none" drops corrupted
+# frames in the middle layer instead, as if the receiver had checked them
+FRAME_CHECKSUM = os.environ.get('FRAME_CHECKSUM', 'crc32').lower()
+FRAME_CHECKSUM = None if FRAME_CHECKSUM in ('', 'none') else FRAME_CHECKSUM
+if FRAME_CHECKSUM is not None and FRAME_CHECKSUM not in CHECKSUMS:
+    raise ValueError('FRAME_CHECKSUM must be one of none, %s, got %r' % (', '.join(sorted(CHECKSUMS)), FRAME_CHECKSUM))
+
+# Structured event log, JSON lines on stdout. Off unless ARQ_LOG_LEVEL is set, e.g. "INFO",
+# "DEBUG" for every frame and ack. The dev server turns it on at INFO.
+# ARQ_LOG_SAMPLE keeps only a share of the events below WARNING, e.g. "/go-back-N=0.1,*=0.01"
+ARQ_LOG_LEVEL = os.environ.get('ARQ_LOG_LEVEL')
+ARQ_LOG_SAMPLE = os.environ.get('ARQ_LOG_SAMPLE')
+
+# To run more than one worker, share protocol state and socket.io messages between them
+# ARQ_STATE_STORE : unset (this process only), "memory" or "redis://host:port/db"
+# SOCKETIO_MESSAGE_QUEUE : e.g. "redis://host:port/db"
+ARQ_STATE_STORE = os.environ.get('ARQ_STATE_STORE')
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
 
 # #############################  ### Initialise flask ######################################
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
-socketio = SocketIO(app, async_mode=async_mode)
+socketio = SocketIO(app, async_mode=async_mode, message_queue=SOCKETIO_MESSAGE_QUEUE)
 thread = None
 thread_lock = Lock()
+channel = DelayScheduler(socketio, delay=CHANNEL_DELAY)
+events = EventLog().configure(ARQ_LOG_LEVEL, ARQ_LOG_SAMPLE)
 
 
-# ########################### serve stop and wait events #############################
-
-# ################################# Establish Connection  #####################################
-
-# Accepting connection from client
-@socketio.on('connect', namespace='/stop-and-wait')
-def saw_server_coming_alive():
+def new_channel_model(protocol, seed=None):
     """
-    From : Predefined event connect. Called when server comes alive.
-    Task : Initialise session variables
-    To   : Server start message at frontend
+    Task : channel model for a new connection, seeded from CHANNEL_SEED, the connect query or at random
     """
-    session['currentPacket'] = 0
-    session['currentAck'] = 0
-    session['expectedAck'] = 0
-    emit('server_started')
-    # emit('complete_connection', {'data': 'Hi Receiver!'})
+    ackCorrupt = PROTOCOL_STRATEGIES[protocol].ack_corrupt if CHANNEL_ACK_CORRUPT is None else CHANNEL_ACK_CORRUPT
+    return channel_from_config(CHANNEL_MODEL, CHANNEL_LOSS, CHANNEL_ACK_LOSS, CHANNEL_CORRUPT,
+                               ackCorrupt, CHANNEL_DUPLICATE, CHANNEL_REORDER, CHANNEL_GILBERT,
+                               CHANNEL_SEED if seed is None else seed)
 
 
-@socketio.on('connectionRequestToMiddleLayerBackend', namespace='/stop-and-wait')
-def saw_connection_request_to_middle_layer_backend(message):
-    """
-    From : Receiver frontend after receiver said hi to sender
-    Task : Simply pass data from receiver front end to middle layer frontend
-    To   : Middle layer frontend - to display log
-    """
-    emit('connectionRequestToMiddleLayerFrontend', {'data': message['data']})
+def new_rto_estimator():
+    return RtoEstimator(RETRANSMIT_TIMEOUT, RTO_MIN, RTO_MAX)
 
 
-@socketio.on('connectionRequestToSenderBackend', namespace='/stop-and-wait')
-def saw_connection_request_to_sender_backend(message):
-    """
-    From : Middle layer frontend
-    Task : If receiver greets, then all good. Else, fail connection
-    To   : Sender frontend - to display log
-    """
-    if message['data'] == 'Hi Sender!':
-        emit('connectionRequestToSenderFrontend', {
-             'data': 'Connection established. Hello Receiver!'})
-    else:
-        emit('connection_failure', {'data': 'Connection denied, Retry!'})
+# protocol state of every connection, keyed by namespace and request.sid
+sessions = SessionRegistry(store_from_url(ARQ_STATE_STORE), channels=new_channel_model, seq_bits=SEQUENCE_BITS,
+                           timeouts=new_rto_estimator)
 
 
-# ###################################### Ping Pong #######################################
-
-@socketio.on('HeyPing', namespace='/stop-and-wait')
-def saw_ping_pong():
+def arq_session():
     """
-    From : ping
-    Task : simply emit pong and help in roundtrip latency calculation 
-    To   : pong
+    Task : sender, receiver and timers of the calling connection.
+           Loaded once per event, and written back by save_arq_session() afterwards.
     """
-    emit('HeyPong')
-
-# ###################################### Transmission #######################################
+    state = g.get('arq_session')
+    if state is None:
+        state = g.arq_session = sessions.get(request.sid, request.namespace)
+    return state
 
 
-@socketio.on('sendPacketToSenderBackend', namespace='/stop-and-wait')
-def saw_handling_packet_at_sender_backend(message):
+@app.teardown_request
+def save_arq_session(exception):
     """
-    From : Sender Input form OR retransmissions
-    Task : initialise session variables
-    To   : send Packet to sender frontend
+    From : Flask, after every http request and every socket.io event
+    Task : write the protocol state the event touched back to the shared store
     """
-    print(message)
-    session['currentPacket'] = session.get('currentPacket', 0) + 1
-    session['expectedAck'] = session['currentPacket']
-    emit('sendPacketToSenderFrontend',  {
-        'data': message['data'],
-        'currentPacket': session['currentPacket']
-    })
+    state = g.pop('arq_session', None)
+    if state is not None:
+        sessions.save(state)
 
 
-@socketio.on('packetTimerBlast', namespace='/stop-and-wait')
-def saw_handling_timer_Blast_from_sender(message):
+def to_wire(payload, state=None):
     """
-    From : Sender Timer
-    Task : If the acknowledgement of previous packet is successfully received. All good.
-           else, re transmit the message 
-    To   : Middle layer frontend
+    Task : frame / ack payload in the wire format the connection asked for at connect
     """
-    print("Timer Blasted for Packet #", message['currentPacket'])
-    """
-    Case : Missing Packet case
-    Explanation : If current packet ( whose timer blasts after 2 seconds ) 
-    is still greater (even after 2 seconds ) than 
-    packets received by receiver (who should have received atleast 2 more in 2 seconds)
-    then something is wrong. Retransmit.
-
-    Case : Missing acknowledgement case
-    Explanation : Ack is incremented from receiver side, but is never reached at sender.
-    so we decrement the session currentAck whenver ack crashes at middle layer
-    that way, currentExpectedAck (equal to currentPack for stop and wait) 
-    is always > currentAck
+    if (state or arq_session()).wire == wire.BINARY:
+        return wire.encode(payload)
+    return payload
 
-    """
-    if message['currentPacket'] > session['currentAck']:
-        print("Resending Packet number", message['currentPacket'])
-        emit('sendPacketToSenderFrontend', {
-             'data': message['data'], 'currentPacket': message['currentPacket']})
-    else:
-        print("No issues. Packet number", message['currentPacket'], "successful.")
 
+# ################################ Metrics ##################################
+# per worker process, scraped at GET /metrics
 
-@socketio.on('SendPacketToMiddleLayerBackend', namespace='/stop-and-wait')
-def saw_handling_packet_at_middle_layer_backend(message):
-    """
-    From : sender frontend
-    Task : provide some visual delay
-    To   : Middle layer frontend
-    """
-    time.sleep(.05)
-    emit('SendPacketToMiddleLayerFrontend', {
-         'data': message['data'], 'currentPacket': message['currentPacket']})
-    time.sleep(.05)
+metrics = Registry()
+HANDLER_SECONDS = metrics.histogram(
+    'arq_handler_seconds', 'Time spent handling one socket.io event', ('namespace', 'event'))
+FRAME_RTT = metrics.histogram(
+    'arq_frame_rtt_seconds', 'From handing a frame to the sender frontend to its ack, latest send', ('namespace',))
+FRAMES_SENT = metrics.counter(
+    'arq_frames_sent_total', 'Frames handed to the sender frontend, resends included', ('namespace',))
+RETRANSMISSIONS = metrics.counter(
+    'arq_retransmissions_total', 'Frames sent again, after a timeout, a negative ack or SACK blocks',
+    ('namespace', 'cause'))
+CHANNEL_DROPS = metrics.counter(
+    'arq_channel_drops_total', 'Frames and acks the channel model lost or corrupted', ('namespace', 'kind', 'reason'))
+CHECKSUM_FAILURES = metrics.counter(
+    'arq_checksum_failures_total', 'Frames the receiver dropped because they failed their checksum', ('namespace',))
+ACKS_SENT = metrics.counter(
+    'arq_acks_sent_total', 'Acks the server sent for the receiver : on a frame, on their own or coalesced',
+    ('namespace', 'how'))
+PAYLOAD_BYTES = metrics.counter(
+    'arq_payload_bytes_total', 'Payload bytes the receiver took in, duplicates not counted', ('namespace',))
+RTO_SECONDS = metrics.histogram(
+    'arq_rto_seconds', 'Retransmission timeout after every round trip sample', ('namespace',))
+WINDOW_UTILIZATION = metrics.histogram(
+    'arq_window_utilization', 'Share of the sender window in flight, on every ack', ('namespace',),
+    buckets=(.1, .2, .3, .4, .5, .6, .7, .8, .9, 1))
+metrics.gauge('arq_active_sessions', 'Connections with protocol state in this worker', ('namespace',),
+              collect=lambda: Counter((state.namespace,) for state in sessions))
+metrics.gauge('arq_pending_emits', 'Delayed emits waiting in the channel scheduler',
+              collect=lambda: {(): len(channel)})
 
 
-@socketio.on('PackedCrashedAtMiddleLayer', namespace='/stop-and-wait')
-def saw_handling_packet_crash_at_middle_layer():
+def note_sent(state, packetNumbers, spacing=0, cause=None):
     """
-    From : Middle Layer frontend
-    Task : handle packet crash and display debug log at frontend
-    To   : Receiver frontend for debug log
+    Task : packets go out now, or at their replay offset. Count them and start their round trip clocks.
+           cause is 'timeout' or 'nak' for resends
     """
-    emit('packedNotReceivedByReceiver')
+    now = default_timer()
+    for i, packetNumber in enumerate(packetNumbers):
+        state.sent_at[packetNumber] = (now + i * spacing, cause is None)
+    FRAMES_SENT.labels(state.namespace).inc(len(packetNumbers))
+    if cause:
+        RETRANSMISSIONS.labels(state.namespace, cause).inc(len(packetNumbers))
 
 
-@socketio.on('sendPacketToReceiverBackend', namespace='/stop-and-wait')
-def saw_handling_packet_at_receiver_backend(message):
+def note_acked(state, ack, base, sample=True):
     """
-    From : Middle layer frontend
-    Task : packet successfully received. Increment the ackNumber to be sent.
-    To   : Receiver frontend
+    Task : round trip of the acked packet, and how full the window is now.
+           `base` is the sender base from before the ack.
+           sample=False for packets an ack covers besides its own, their round trip tells nothing
     """
-    session['currentAck'] = session.get('currentAck', 0) + 1
-    emit('sendPacketToReceiverFrontend',
-         {'data': message['data'], 'currentPacket': message['currentPacket'], 'currentAck': session['currentAck']})
-
+    sent = state.sent_at.pop(ack, None)
+    if sent is not None and sample:
+        rtt = max(default_timer() - sent[0], 0)
+        FRAME_RTT.labels(state.namespace).observe(rtt)
+        # Karn : the ack of a resent packet may be for any of its copies, it tells nothing
+        # but that the path works again
+        if sent[1]:
+            state.rto.sample(rtt)
+            RTO_SECONDS.labels(state.namespace).observe(state.rto.timeout)
+        else:
+            state.rto.restore()
+    for packetNumber in range(base, state.sender.base):
+        state.sent_at.pop(packetNumber, None)
+    sender = state.sender
+    WINDOW_UTILIZATION.labels(state.namespace).observe((sender.next_seq - sender.base) / float(sender.window_size))
 
-@socketio.on('sendAckToMiddleLayerBackend', namespace='/stop-and-wait')
-def saw_handling_ack_at_middle_layer_backend(message):
-    """
-    From : Receiver frontend
-    Task : packet successfully received. Increment the ackNumber to be sent
-    To   : Middle layer frontend
-    """
-    time.sleep(.05)
-    emit('sendAckToMiddleLayerFrontend', {
-         'data': message['data'], 'currentAck': message['currentAck']})
-    time.sleep(.05)
+
+def log_event(level, event, state=None, **fields):
+    """
+    Task : one structured log line about a connection, the calling one unless `state` is given.
+           e.g. log_event(logging.DEBUG, 'ack_received', ack=7)
+    """
+    if not events.enabled(level):
+        return
+    if state is None:
+        events.log(level, event, sid=request.sid, namespace=request.namespace, **fields)
+    else:
+        events.log(level, event, sid=state.sid, namespace=state.namespace, **fields)
 
 
-@socketio.on('AckCrashedAtMiddleLayer', namespace='/stop-and-wait')
-def saw_handling_ack_crash_at_middle_layer(message):
-    """
-    From : Middle Layer frontend
-    Task : handle Ack crash and display debug log at frontend
-    To   : Sender frontend for debug log
+def emit_after(delay, event, data, state=None):
     """
-    print("Ack #", message['currentAck'], "crashed.")
-    session['currentAck'] = session['currentAck']-1
-    emit('ackNotReceivedBySender')
-
-@socketio.on('sendAckToSenderBackend', namespace='/stop-and-wait')
-def saw_handling_ack_at_sender_backend(message):
+    Task : emit to the calling client, or the one of `state` outside a handler,
+           `delay` seconds from now, without blocking this handler
     """
-    From : Middle Layer frontend
-    Task : Pass on the message and ackNumber
+    if state is None and delay <= 0:
+        emit(event, data)
+    elif state is None:
+        channel.emit_later(delay, event, data, room=request.sid, namespace=request.namespace)
+    elif delay <= 0:
+        socketio.emit(event, data, room=state.sid, namespace=state.namespace)
+    else:
+        channel.emit_later(delay, event, data, room=state.sid, namespace=state.namespace)
+
+
+# ################################ Middle layer channel ##################################
+
+def pass_frame_through_channel(message, reverse=False):
+    """
+    Task : let the channel model decide what happens to a frame.
+           The frame is checksummed on the way in. Lost copies are dropped right here,
+           corrupted ones go on garbled for the receiver to catch, or are dropped here too
+           without a checksum. Copies that make it go on to the middle layer frontend,
+           duplicates and reordered ones a bit later.
+           reverse=True for frames of a two way transfer that go back, they carry a piggybacked ack
+    """
+    state = arq_session()
+    delivered = 'SendReversePacketToMiddleLayerFrontend' if reverse else 'SendPacketToMiddleLayerFrontend'
+    payload = {'data': message['data'], 'currentPacket': message['currentPacket']}
+    if message.get('currentAck') is not None:
+        payload['currentAck'] = message['currentAck']
+    if FRAME_CHECKSUM is not None:
+        payload['checksum'] = frame_checksum(int(message['currentPacket']), message['data'], FRAME_CHECKSUM)
+    copies = state.channel.frame()
+    if not copies:
+        log_event(logging.DEBUG, 'frame_lost', state, seq=message['currentPacket'])
+        CHANNEL_DROPS.labels(state.namespace, 'frame', 'lost').inc()
+        emit_after(channel.delay, 'packetDroppedAtMiddleLayer', dict(payload, reason='lost'))
+    for copy in copies:
+        if copy.corrupted:
+            log_event(logging.DEBUG, 'frame_corrupted', state, seq=message['currentPacket'])
+            CHANNEL_DROPS.labels(state.namespace, 'frame', 'corrupted').inc()
+            garbled = dict(payload, data=state.channel.garble(payload['data']))
+            if FRAME_CHECKSUM is not None:
+                emit_after(channel.delay * copy.delay, delivered, to_wire(garbled, state))
+            else:
+                emit_after(channel.delay * copy.delay, 'packetDroppedAtMiddleLayer', dict(garbled, reason='corrupted'))
+        else:
+            emit_after(channel.delay * copy.delay, delivered, to_wire(payload, state))
+
+
+def pass_ack_through_channel(message, nak=True, state=None, reverse=False):
+    """
+    Task : same for an ack. A corrupted ack becomes a negative ack when the protocol
+           has one (nak=True), and is dropped otherwise.
+           `state` is for acks that do not come from a handler, the delayed acks of two way
+           transfers. Those that go back (reverse=True) have no negative ack
+    """
+    delivered = 'sendReverseAckToMiddleLayerFrontend' if reverse else 'sendAckToMiddleLayerFrontend'
+    nak = nak and not reverse
+    state = state or arq_session()
+    payload = dict((key, message[key]) for key in ('data', 'currentPacket', 'currentAck', 'sack') if key in message)
+    copies = state.channel.ack()
+    if not copies:
+        log_event(logging.DEBUG, 'ack_lost', state, ack=message['currentAck'])
+        CHANNEL_DROPS.labels(state.namespace, 'ack', 'lost').inc()
+        emit_after(channel.delay, 'ackDroppedAtMiddleLayer', dict(payload, reason='lost'), state)
+    for copy in copies:
+        if not copy.corrupted:
+            emit_after(channel.delay * copy.delay, delivered, to_wire(payload, state), state)
+        elif nak:
+            emit_after(channel.delay * copy.delay, 'sendCorruptedAckToMiddleLayerFrontend', to_wire(payload, state),
+                       state)
+        else:
+            log_event(logging.DEBUG, 'ack_corrupted', state, ack=message['currentAck'])
+            CHANNEL_DROPS.labels(state.namespace, 'ack', 'corrupted').inc()
+            emit_after(channel.delay * copy.delay, 'ackDroppedAtMiddleLayer', dict(
+                payload, data=state.channel.garble(payload['data']), reason='corrupted'), state)
+
+
+def frame_intact(state, message, nak):
+    """
+    Task : check a frame against the checksum the middle layer stamped on it. A frame that
+           fails is dropped before the receiver state machine sees it, and the receiver
+           frontend sends a negative ack for it when the protocol has them (nak=True).
+           Frames relayed without a checksum are taken as they are
+    To   : True if the frame may go on to the receiver
+    """
+    checksum = message.get('checksum')
+    if FRAME_CHECKSUM is None or checksum is None:
+        return True
+    if frame_checksum(int(message['currentPacket']), message['data'], FRAME_CHECKSUM) == int(checksum):
+        return True
+    log_event(logging.DEBUG, 'frame_checksum_failed', state, seq=message['currentPacket'])
+    CHECKSUM_FAILURES.labels(state.namespace).inc()
+    if nak:
+        data = message['data']
+        emit('sendCorruptedPacketToReceiverFrontend', to_wire({
+            'data': '%d bytes' % len(data) if state.incoming is not None else data,
+            'currentPacket': message['currentPacket']}, state))
+    return False
+
+
+# ################################ Retransmission timers ##################################
+
+def arm_retransmission_timer(packetNumber, data, delay=0):
+    """
+    Task : start the server side timer of a packet that reaches the sender frontend
+           after `delay` seconds. Re-arming a packet replaces its old timer.
+    """
+    state = arq_session()
+    state.timers.arm(packetNumber, delay + state.rto.timeout, retransmission_timer_blast,
+                     state, packetNumber, data)
+    channel.drive(state.timers)
+
+
+def back_off(state, resend):
+    """
+    Task : double the timeout once per loss, when the oldest packet goes again.
+           Selective repeat has a timer going off for every lost packet, that is no reason to double each time
+    """
+    if resend and resend[0] == state.sender.base:
+        state.rto.backoff()
+
+
+def retransmission_timer_blast(state, packetNumber, data):
+    """
+    From : Server side retransmission timer, no frontend round trip involved
+    Task : If the packet is still unacknowledged, resend whatever the sender wants resent
+           and re-arm their timers
     To   : Sender frontend
     """
-    emit('sendAckToSenderFrontend', {
-         'data': message['data'], 'currentAck': message['currentAck']})
-
-
-# ################################# Disconnection events #################################
-
-# Requesting termination of connection
-@socketio.on('disconnect_request', namespace='/stop-and-wait')
-def saw_handling_disconnect_request_at_backend(message):
-    """
-    From : User requested connection termination
-    Task : Tie the loose ends, the call the disconnect() event
-    To   : disconnection frontend
-    """
-    emit('disconnecting_confirmation', {
-         'data': message['data'] + 'Disconnected!'})
-
-
-# Server disconnected
-@socketio.on('disconnect', namespace='/stop-and-wait')
-def saw_test_disconnect():
+    # another worker may have handled events of this connection meanwhile, or its disconnect
+    state = sessions.get(state.sid, state.namespace, create=False)
+    if state is None:
+        return
+    resend = state.sender.on_timeout(packetNumber)
+    if not resend:
+        return
+    back_off(state, resend)
+    log_event(logging.INFO, 'timeout', state, seq=packetNumber, resend=list(resend), rto=state.rto.timeout)
+    # a go back N resend carries every frame the way it first went out
+    labels = dict((number, state.sender.frame(number) or packet_label(state, number)) for number in resend)
+    labels[packetNumber] = data
+    event, payload = packets_message(resend, labels=labels, binary=state.wire == wire.BINARY,
+                                     space=state.sender.space, acks=forward_piggyback(state, resend))
+    socketio.emit(event, payload, room=state.sid, namespace=state.namespace)
+    note_sent(state, resend, cause='timeout')
+    for number in resend:
+        state.timers.arm(number, state.rto.timeout, retransmission_timer_blast,
+                         state, number, labels[number])
+    sessions.save(state)
+
+
+# ############################ Payload transfer ##############################
+
+def receive_payload(state, packetNumber, data, accepted):
+    """
+    Task : write a frame the receiver took in to its place in the payload. Frames are written as
+           they are accepted, in any order, the preallocated buffer is the reorder buffer too.
+           Once the last one is in, compare checksums and report the goodput
+    To   : Receiver frontend, when the payload is complete
+    """
+    incoming = state.incoming
+    if not accepted or incoming.done or not incoming.put(packetNumber, data):
+        return
+    PAYLOAD_BYTES.labels(state.namespace).inc(len(data))
+    if not incoming.done:
+        return
+    seconds = max(default_timer() - incoming.started, 1e-9)
+    checksum = incoming.checksum()
+    intact = checksum == state.outgoing.checksum()
+    log_event(logging.INFO if intact else logging.WARNING, 'payload_received', state,
+              size=incoming.size, seconds=round(seconds, 6), intact=intact)
+    emit('sendPayloadCompleteToReceiverFrontend', {
+        'size': incoming.size, 'frames': incoming.frames, 'checksum': checksum, 'intact': intact,
+        'seconds': seconds, 'bytesPerSecond': incoming.size / seconds})
+
+
+# ############################ Handing packets to the sender frontend ##############################
+
+def packet_label(state, packetNumber):
+    """
+    Task : default data of a packet, "D<number>" with the number as it goes on the wire,
+           or its slice of the payload during a payload transfer
+    """
+    if state.outgoing is not None:
+        return state.outgoing.segment(packetNumber)
+    return 'D' + str(state.sender.space.wrap(packetNumber))
+
+
+# events that hand one packet, and a batch of them, to the frontend that sends them
+PACKET_EVENTS = ('sendPacketToSenderFrontend', 'sendPacketBatchToSenderFrontend')
+REVERSE_PACKET_EVENTS = ('sendReversePacketToReceiverFrontend', 'sendReversePacketBatchToReceiverFrontend')
+
+
+def packets_message(packetNumbers, spacing=0, labels=None, binary=False, space=None, acks=None, reverse=False):
+    """
+    Task : event and payload that hand packets to the sender frontend.
+           One packet goes on its own. More go as a single batch, where every packet
+           carries the offset (ms) at which the frontend replays it.
+           With a sequence space, packet numbers go out wrapped to its width.
+           acks maps packet numbers to the ack they carry, see piggyback().
+           reverse=True hands the way back of a two way transfer to the receiver frontend
+    """
+    labels = labels or {}
+    acks = acks or {}
+    wrap = space.wrap if space is not None else int
+    packets = [{'data': labels.get(n, 'D' + str(wrap(n))), 'currentPacket': wrap(n)} for n in packetNumbers]
+    for n, packet in zip(packetNumbers, packets):
+        if n in acks:
+            packet['currentAck'] = acks[n]
+    if not binary:
+        # socket.io only sends bytes as attachments, payload slices are copied here, once
+        for packet in packets:
+            if isinstance(packet['data'], memoryview):
+                packet['data'] = packet['data'].tobytes()
+    single, batch = REVERSE_PACKET_EVENTS if reverse else PACKET_EVENTS
+    if len(packets) == 1:
+        return single, wire.encode(packets[0]) if binary else packets[0]
+    for i, packet in enumerate(packets):
+        packet['offset'] = int(i * spacing * 1000)
+    if binary:
+        return batch, wire.encode_batch(packets)
+    return batch, {'packets': packets}
+
+
+def send_packets_to_sender_frontend(packetNumbers, spacing=0, labels=None, cause=None):
+    """
+    Task : hand packets to the sender frontend in one message, and arm the timer
+           of each from the moment the frontend replays it.
+           labels maps packet numbers to their data, the rest are "D<number>".
+           cause is 'timeout' or 'nak' for resends, see note_sent
+    To   : Sender frontend
     """
-    From : predefined disconnect event
-    Task : Disconnect the server from client
-    To   : None. Print logs to console.
+    packetNumbers = list(packetNumbers)
+    if not packetNumbers:
+        return
+    labels = labels or {}
+    state = arq_session()
+    # a resend carries the frame the way it first went out, when the sender kept it
+    labels = dict((n, labels.get(n) or state.sender.frame(n) or packet_label(state, n)) for n in packetNumbers)
+    event, payload = packets_message(packetNumbers, spacing, labels, binary=state.wire == wire.BINARY,
+                                     space=state.sender.space, acks=forward_piggyback(state, packetNumbers))
+    emit(event, payload)
+    note_sent(state, packetNumbers, spacing, cause)
+    for i, packetNumber in enumerate(packetNumbers):
+        # payload slices are not kept, the sender is pickled into the state store and a resend
+        # slices the payload again, see packet_label()
+        if state.outgoing is None:
+            state.sender.keep(packetNumber, labels[packetNumber])
+        arm_retransmission_timer(packetNumber, labels[packetNumber], i * spacing)
+
+
+def take_ack(sender, wireAck, sack=None):
+    """
+    Task : hand an ack off the wire to a sender. One that carries ranges, SACK blocks or
+           coalesced acks, goes in one on_sack() call
+    To   : (ack, frames newly acked, frames to transmit, frames to retransmit)
+    """
+    ack = sender.unwrap(wireAck)
+    if not sack:
+        return ack, [ack], sender.on_ack(ack), []
+    ranges = [(sender.unwrap(int(first)), sender.unwrap(int(last))) for first, last in sack]
+    # the ack's own frame counts too, even when it fell out of the blocks
+    return (ack,) + sender.on_sack([(first, last) for first, last in ranges if first <= last] + [(ack, ack)])
+
+
+def ack_arrived(state, wireAck, sack=None):
+    """
+    Task : an ack for the sender, on its own, coalesced or riding on a frame of the way back.
+           Slide the window and send what fits into it, then resend the holes SACK blocks show
+    To   : Sender frontend
     """
-    print('Receiver disconnected', request.sid)
-
+    sender = state.sender
+    base = sender.base
+    backedOff = state.rto.backoffs
+    ack, acked, nextPackets, resend = take_ack(sender, wireAck, sack)
+    log_event(logging.DEBUG, 'ack_received', ack=ack, base=sender.base, acked=len(acked))
+    before = base
+    for packetNumber in acked:
+        # the round trip is the one of the frame this ack is for, the others may have been acked late
+        note_acked(state, packetNumber, before, sample=packetNumber == ack)
+        before = sender.base
+        state.timers.cancel(packetNumber)
+    # a cumulative ack settles everything below the new base, a selective one just itself
+    state.timers.cancel_range(base, sender.base)
+    if backedOff and not state.rto.backoffs:
+        # the path works again, the rest of the window need not sit out the backed off timeout
+        for packetNumber in range(sender.base, sender.next_seq):
+            state.timers.rearm(packetNumber, state.rto.timeout)
+        channel.drive(state.timers)
+    send_packets_to_sender_frontend(nextPackets)
+    send_packets_to_sender_frontend(resend, cause='sack')
+    if sender.done:
+        # all done
+        emit('sendCompletionMessage')
 
 
-# ############################ Serving stop and wait #####################################
+# ############################ Ack coalescing ##############################
+# With ACK_EVERY above 1 the receiver frontend only shows frames, the server acks them
+# for it, several at once. Two way transfers send the acks left over the same way.
 
-# when namespaces are ready - change it to @app.route('/selective-repeat')
-@app.route('/stop-and-wait')
-def saw_stop_and_wait():
+def send_owed_acks(state, owed, space, mark, nak, reverse=False, blocks=None):
     """
-    From : User navigates to "localhost:5000" in a new tab
-    Task : Serve the "templates/index.html" page to user
-    To   : None. Wait for events to start.
+    Task : everything `owed` holds, as one ack through the middle layer. A cumulative ack
+           stands for all of them, selective ones go as ranges in `sack`, or as the
+           receiver's SACK `blocks` when it keeps them
+    To   : how many acks went
     """
-    return render_template('stop-and-wait.html', async_mode=socketio.async_mode)
-
+    acks = owed.drain()
+    if not acks:
+        return 0
+    wireAck = space.wrap(acks[-1])
+    message = {'data': 'Ack for Packet : %s%d' % (mark, wireAck), 'currentPacket': wireAck, 'currentAck': wireAck}
+    if blocks is None and len(acks) > 1:
+        blocks = ack_ranges(acks)
+    if blocks:
+        message['sack'] = [(space.wrap(first), space.wrap(last)) for first, last in blocks]
+        message['data'] = 'Ack for Packets : ' + ', '.join(
+            mark + str(first) if first == last else '%s%d-%s%d' % (mark, first, mark, last)
+            for first, last in message['sack'])
+    pass_ack_through_channel(message, nak=nak, state=state, reverse=reverse)
+    return len(acks)
 
 
-# ################################ Serving go back N events ####################################
-
-# ################################# Establish Connection  #####################################
-
-# Accepting connection from client
-@socketio.on('connect', namespace='/go-back-N')
-def gbn_server_coming_alive():
+def coalesce_ack(state, ack):
     """
-    From : Predefined event connect. Called when server comes alive.
-    Task : Initialise session variables
-    To   : Server start message at frontend
+    Task : hold the receiver's ack back until it owes ACK_EVERY frames, or the first of them
+           has waited ACK_DELAY, then send them all in one message
+    To   : Middle layer frontend, when that is now
     """
-    session['currentPacket'] = 0
-    session['currentAck'] = 0
-    session['expectedAck'] = 0
-    session['lastReceivedAck'] = 0
-    session['receivedAcks'] = []
-    emit('server_started')
-    # emit('complete_connection', {'data': 'Hi Receiver!'})
+    if state.owed is None:
+        state.owed = OwedAcks(state.sender.cumulative)
+    first = state.owed.owe(ack)
+    if state.owed.frames >= ACK_EVERY:
+        state.timers.cancel('forward_ack')
+        send_coalesced_acks(state)
+    elif first:
+        state.timers.arm('forward_ack', ACK_DELAY, coalesced_ack_blast, state)
+        channel.drive(state.timers)
 
 
-@socketio.on('connectionRequestToMiddleLayerBackend', namespace='/go-back-N')
-def gbn_connection_request_to_middle_layer_backend(message):
-    """
-    From : Receiver frontend after receiver said hi to sender
-    Task : Simply pass data from receiver front end to middle layer frontend
-    To   : Middle layer frontend - to display log
-    """
-    emit('connectionRequestToMiddleLayerFrontend', {'data': message['data']})
+def send_coalesced_acks(state):
+    strategy = PROTOCOL_STRATEGIES[state.protocol]
+    sent = send_owed_acks(state, state.owed, state.receiver.space, 'D', strategy.naks,
+                          blocks=state.receiver.sack() if strategy.sack else None)
+    ACKS_SENT.labels(state.namespace, 'coalesced').inc(sent)
 
 
-@socketio.on('connectionRequestToSenderBackend', namespace='/go-back-N')
-def gbn_connection_request_to_sender_backend(message):
+def coalesced_ack_blast(state):
     """
-    From : Middle layer frontend
-    Task : If receiver greets, then all good. Else, fail connection
-    To   : Sender frontend - to display log
+    From : Coalesced ack timer, fewer than ACK_EVERY frames came in ACK_DELAY
+    Task : send what the receiver owes so far
+    To   : Middle layer frontend
     """
-    if message['data'] == 'Hi Sender!':
-        emit('connectionRequestToSenderFrontend', {
-            'data': 'Connection established. Hello Receiver!'})
-    else:
-        emit('connection_failure', {'data': 'Connection denied, Retry!'})
+    state = sessions.get(state.sid, state.namespace, create=False)
+    if state is not None and state.owed is not None:
+        send_coalesced_acks(state)
+        sessions.save(state)
 
 
-# ###################################### Ping Pong #######################################
+# ############################ Two way transfers ##############################
+# The receiver frontend sends frames back to the sender frontend, see arq/duplex.py.
+# No ack goes on its own while a frame going the other way can carry it. The way back
+# is numbered 'R<number>' and its timers are keyed ('reverse', number).
 
-@socketio.on('HeyPing', namespace='/go-back-N')
-def gbn_ping_pong():
+def piggyback(state, owed, space, timerKey, packetNumbers):
     """
-    From : ping
-    Task : simply emit pong and help in roundtrip latency calculation 
-    To   : pong
+    Task : put one owed ack on each frame about to go out, as long as any are owed.
+           Once none are, the delayed ack timer `timerKey` has nothing left to send
+    To   : {packet number: ack as it goes on the wire}
     """
-    emit('HeyPong')
-
+    acks = {}
+    fresh = 0
+    for packetNumber in packetNumbers:
+        ack = owed.take()
+        if ack is not None:
+            fresh += 1
+        elif owed.last is not None:
+            # nothing new, the latest ack again costs nothing and stands in for one lost with its frame
+            ack = owed.last
+        else:
+            break
+        acks[packetNumber] = space.wrap(ack)
+    if fresh:
+        ACKS_SENT.labels(state.namespace, 'piggybacked').inc(fresh)
+        if not owed:
+            state.timers.cancel(timerKey)
+    return acks
 
-# ###################################### Transmission #######################################
 
-
-@socketio.on('sendPacketToSenderBackendBurst', namespace='/go-back-N')
-def gbn_handling_packet_at_sender_backend_in_burst_mode(message):
+def forward_piggyback(state, packetNumbers):
     """
-    From : Sender Input form OR retransmissions
-    Task : initialise session variables
-    To   : send Packet to sender frontend
+    Task : acks of the way back, for frames of the session sender. None outside a two way transfer
     """
-    print("Burst Mode Active. Initialise sliding window.")
-    # print(message)
-    initial = int(session.get('currentPacket', 0 )) + 1
-    session['totalNumberOfPackets'] = int(message['totalNumberOfPackets']) + int(session.get('currentPacket', 0))
-    session['slidingWindow'] = [ i+initial for i in range(int(message['windowSize']))]
-
-    print(session['slidingWindow'])
-    for packetNumber in session['slidingWindow']:
-        gbn_handling_packet_at_sender_backend({
-            'currentPacketNumber' : packetNumber
-        })
-        # time.sleep(.05)
-        time.sleep(.05)
+    if state.duplex is None:
+        return None
+    return piggyback(state, state.duplex.owed_reverse, state.duplex.receiver.space, 'reverse_ack', packetNumbers)
 
 
-@socketio.on('sendPacketToSenderBackend', namespace='/go-back-N')
-def gbn_handling_packet_at_sender_backend(message):
+def owe_ack(state, ack, reverse):
     """
-    From : Sender Input form OR retransmissions
-    Task : initialise session variables
-    To   : send Packet to sender frontend
+    Task : an ack to send the other way. It waits up to ACK_DELAY for a frame to ride on
     """
-    # session['currentPacket'] = session.get('currentPacket',0) + 1
+    duplex = state.duplex
+    owed = duplex.owed_reverse if reverse else duplex.owed_forward
+    if owed.owe(ack):
+        state.timers.arm('reverse_ack' if reverse else 'forward_ack', ACK_DELAY, delayed_ack_blast, state, reverse)
+        channel.drive(state.timers)
 
-    session['currentPacket'] = message["currentPacketNumber"]
-    print("now ", session['currentPacket'])
-    emit('sendPacketToSenderFrontend', {
-        'data': 'D' + str(session['currentPacket']),
-        'currentPacket': session['currentPacket']})
-    session['expectedAck'] = session['currentPacket']
-    
 
-@socketio.on('packetTimerBlast', namespace='/go-back-N')
-def gbn_handling_timer_Blast_from_sender(message):
+def delayed_ack_blast(state, reverse):
     """
-    From : Sender Timer
-    Task : If the acknowledgement of previous packet is successfully received. All good.
-           else, re transmit the message 
+    From : Delayed ack timer, no frame went the other way in time
+    Task : send every ack still owed on its own, through the middle layer
     To   : Middle layer frontend
     """
-    print("Timer Blasted for Packet #", message['currentPacket'])
-    """
-    Case : Missing Packet case
-    Explanation : If current packet ( whose timer blasts after 2 seconds ) 
-    is still greater (even after 2 seconds ) than 
-    packets received by receiver (who should have received atleast 2 more in 2 seconds)
-    then something is wrong. Retransmit.
-
-    Case : Missing acknowledgement case
-    Explanation : Ack is incremented from receiver side, but is never reached at sender.
-    so we decrement the session currentAck whenever ack crashes at middle layer
-    that way, currentExpectedAck (equal to currentPack for stop and wait) 
-    is always > currentAck
-
-    Assumption : packet always come in sorted order
-
-    """
-    if message['currentPacket'] not in session['receivedAcks']:
-        print("Resending Packet number", message['currentPacket'])
-        emit('sendPacketToSenderFrontend', {
-            'data': message['data'], 'currentPacket': message['currentPacket']})
+    state = sessions.get(state.sid, state.namespace, create=False)
+    if state is None or state.duplex is None:
+        return
+    duplex = state.duplex
+    if reverse:
+        owed, space, mark, nak = duplex.owed_reverse, duplex.receiver.space, 'R', False
     else:
-        print("No issues. Packet number", message['currentPacket'], "successful.")
+        owed, space, mark, nak = duplex.owed_forward, state.receiver.space, 'D', \
+            PROTOCOL_STRATEGIES[state.protocol].naks
+    # with both windows full, both ends owe acks and neither has a frame to put them on.
+    # These acks let frames out the other way, the acks owed this way can wait for them
+    state.timers.rearm('forward_ack' if reverse else 'reverse_ack', ACK_DELAY)
+    ACKS_SENT.labels(state.namespace, 'alone').inc(send_owed_acks(state, owed, space, mark, nak, reverse))
+    sessions.save(state)
 
 
-@socketio.on('SendPacketToMiddleLayerBackend', namespace='/go-back-N')
-def gbn_handling_packet_at_middle_layer_backend(message):
-    """
-    From : sender frontend
-    Task : provide some visual delay
-    To   : Middle layer frontend
+def send_reverse_packets(state, packetNumbers, spacing=0, cause=None):
     """
-    time.sleep(.05)
-    emit('SendPacketToMiddleLayerFrontend', {
-        'data': message['data'], 'currentPacket': message['currentPacket']})
-    time.sleep(.05)
-
-
-@socketio.on('PackedCrashedAtMiddleLayer', namespace='/go-back-N')
-def gbn_handling_packet_crash_at_middle_layer():
-    """
-    From : Middle Layer frontend
-    Task : handle packet crash and display debug log at frontend
-    To   : Receiver frontend for debug log
-    """
-    emit('packedNotReceivedByReceiver')
-
-
-@socketio.on('sendPacketToReceiverBackend', namespace='/go-back-N')
-def gbn_handling_packet_at_receiver_backend(message):
-    """
-    From : Middle layer frontend
-    Task : packet successfully received. Increment the ackNumber to be sent.
+    Task : hand frames of the way back to the receiver frontend, each carrying an ack
+           for the session sender while any is owed, and arm their timers.
+           They share the session's retransmission timeout, it only learns from the forward acks
     To   : Receiver frontend
     """
-    session['currentAck'] = int(message['currentPacket'])
-    session['lastReceivedAck'] = session.get('lastReceivedAck',0)
-
-    if(int(message['currentPacket']) == session['lastReceivedAck']+1):
-        emit('sendPacketToReceiverFrontend', {
-        'data': message['data'], 
-        'currentPacket': message['currentPacket'], 
-        'currentAck': session['currentAck']
-        })
-    else:
-        emit('sendRejectedPacketToReceiverFrontend', {
-        'data': message['data'], 
-        'currentPacket': message['currentPacket'], 
-        'currentAck': session['currentAck']
-        })
-
-
-@socketio.on('sendAckToMiddleLayerBackend', namespace='/go-back-N')
-def gbn_handling_ack_at_middle_layer_backend(message):
-    """
-    From : Receiver frontend
-    Task : packet successfully received. Increment the ackNumber to be sent
-    To   : Middle layer frontend
-    """
-    time.sleep(.05)
-    emit('sendAckToMiddleLayerFrontend', {
-        'data': message['data'],
-        'currentPacket' : message['currentPacket'],
-         'currentAck': message['currentAck']})
-    time.sleep(.05)
-
-
-@socketio.on('AckCrashedAtMiddleLayer', namespace='/go-back-N')
-def gbn_handling_ack_crash_at_middle_layer(message):
-    """
-    From : Middle Layer frontend
-    Task : handle Ack crash and display debug log at frontend
-    To   : Sender frontend for debug log
-    """
-    session['currentAck'] = int(session['currentAck'])-1 
-    print("Ack #", message['currentAck'], "crashed.")
-    emit('ackNotReceivedBySender', {
-        'currentAck': message['currentAck']
-    })
-    
-
-@socketio.on('sendAckToSenderBackend', namespace='/go-back-N')
-def gbn_handling_ack_at_sender_backend(message):
-    """
-    From : Middle Layer frontend
-    Task : Pass on the message and ackNumber
-    To   : Sender frontend
-    """
-    emit('sendAckToSenderFrontend', {
-        'data': message['data'], 'currentAck': message['currentAck']})
-    
-    # slide window as well
-    # actual sliding will be probelmatic, so i just send next packet
-
-    print("ack got", message["currentAck"])
-    session['receivedAcks'].append(int(message['currentPacket']))
-    session['lastReceivedAck'] = max(session['receivedAcks'])
-
-    print("Nice job bro")
-    if( int(session['currentPacket']) < int(session['totalNumberOfPackets'])):
-        print("keep it up")
-        gbn_handling_packet_at_sender_backend({
-            'currentPacketNumber' : int(session['currentPacket']) + 1
-        })
-    else:
-        # all done
-        emit('sendCompletionMessage')
-
-
-@socketio.on('sendNegAckToSenderBackend', namespace='/go-back-N')
-def gbn_handling_negative_ack_at_sender_backend(message):
-    """
-    From : Middle Layer frontend
-    Task : Pass on the message and ackNumber
-    To   : Sender frontend
+    packetNumbers = list(packetNumbers)
+    if not packetNumbers:
+        return
+    sender = state.duplex.sender
+    labels = dict((n, sender.frame(n) or 'R' + str(sender.space.wrap(n))) for n in packetNumbers)
+    acks = piggyback(state, state.duplex.owed_forward, state.receiver.space, 'forward_ack', packetNumbers)
+    event, payload = packets_message(packetNumbers, spacing, labels, binary=state.wire == wire.BINARY,
+                                     space=sender.space, acks=acks, reverse=True)
+    socketio.emit(event, payload, room=state.sid, namespace=state.namespace)
+    FRAMES_SENT.labels(state.namespace).inc(len(packetNumbers))
+    if cause:
+        RETRANSMISSIONS.labels(state.namespace, cause).inc(len(packetNumbers))
+    for i, packetNumber in enumerate(packetNumbers):
+        sender.keep(packetNumber, labels[packetNumber])
+        state.timers.arm(('reverse', packetNumber), i * spacing + state.rto.timeout, reverse_timer_blast,
+                         state, packetNumber)
+    channel.drive(state.timers)
+
+
+def reverse_timer_blast(state, packetNumber):
+    """
+    From : Retransmission timer of a frame of the way back
+    Task : resend whatever the sender of the way back wants resent
+    To   : Receiver frontend
     """
-    emit('sendNegAckToSenderFrontend', {
-        'data': message['data'], 'currentPacket': message['currentPacket'] , 'currentAck': message['currentAck']})
-    
-    # slide window as well
-    # actual sliding will be probelmatic, so i just send next packet
-    
-    gbn_handling_packet_at_sender_backend({
-        'currentPacketNumber' : int(message['currentPacket'])
-    })
+    state = sessions.get(state.sid, state.namespace, create=False)
+    if state is None or state.duplex is None:
+        return
+    resend = state.duplex.sender.on_timeout(packetNumber)
+    if not resend:
+        return
+    log_event(logging.INFO, 'reverse_timeout', state, seq=packetNumber, resend=list(resend))
+    send_reverse_packets(state, resend, cause='timeout')
+    sessions.save(state)
 
 
-# ################################# Disconnection events #################################
-
-# Requesting termination of connection
-@socketio.on('disconnect_request', namespace='/go-back-N')
-def gbn_handling_disconnect_request_at_backend(message):
+def reverse_ack_arrived(state, wireAck, sack=None):
     """
-    From : User requested connection termination
-    Task : Tie the loose ends, the call the disconnect() event
-    To   : disconnection frontend
+    Task : an ack for the way back, on its own or riding on a frame of the session sender.
+           Slide its window and send what fits into it
+    To   : Receiver frontend
     """
-    emit('disconnecting_confirmation', {
-        'data': message['data'] + 'Disconnected!'})
-
+    duplex = state.duplex
+    sender = duplex.sender
+    base = sender.base
+    ack, acked, nextPackets, resend = take_ack(sender, wireAck, sack)
+    log_event(logging.DEBUG, 'reverse_ack_received', state, ack=ack, base=sender.base, acked=len(acked))
+    for packetNumber in acked:
+        state.timers.cancel(('reverse', packetNumber))
+    for packetNumber in range(base, sender.base):
+        state.timers.cancel(('reverse', packetNumber))
+    send_reverse_packets(state, nextPackets)
+    send_reverse_packets(state, resend, cause='sack')
+    if duplex.done:
+        socketio.emit('sendReverseCompletionMessage', room=state.sid, namespace=state.namespace)
+
+
+# ################################# Protocol strategies #####################################
+# What differs between the protocols at the socket layer. Everything else is the
+# state machines of arq/protocols.py, driven by the one ProtocolNamespace below.
+
+class ProtocolStrategy(object):
+    """
+    Objective : plug a protocol into the server
+    Approach  : `name` is the namespace, the page and the key in arq.PROTOCOLS.
+                Subclasses override the few hooks where their frontend differs.
+    """
+    name = None
+    template = None
+    # a corrupted ack reaches the sender as a negative ack
+    naks = True
+    # share of acks the middle layer corrupts unless CHANNEL_ACK_CORRUPT says otherwise
+    ack_corrupt = .15
+    # the receiver may ack several frames in one message, see ACK_EVERY
+    coalesce = True
+    # acks carry SACK blocks, everything the receiver holds
+    sack = False
+
+    def requested_packets(self, sender, message):
+        """
+        Task : packets to send for a sendPacketToSenderBackend request
+        To   : (packet numbers, {packet number: data} or None)
+        """
+        return [int(message['currentPacketNumber'])], None
+
+    def receiver_event(self, accepted, ack):
+        """
+        Task : event that shows a frame at the receiver frontend, None to drop it silently.
+               The receiver frontend acks whatever reaches sendPacketToReceiverFrontend.
+        """
+        return 'sendPacketToReceiverFrontend' if ack is not None else None
+
+
+class StopAndWaitStrategy(ProtocolStrategy):
+    name = 'stop-and-wait'
+    template = 'stop-and-wait.html'
+    naks = False
+    # the page only ever lost acks. Without naks a corrupted one is one more lost ack
+    ack_corrupt = 0.0
+    # the next frame waits for this one's ack, there is never a second one to wait for
+    coalesce = False
+
+    def requested_packets(self, sender, message):
+        # the page sends its own text, one packet at a time.
+        # buttons stay disabled until the ack, so the window is always free here
+        packetNumbers = list(sender.load(1))
+        return packetNumbers, dict.fromkeys(packetNumbers, message['data'])
+
+
+class GoBackNStrategy(ProtocolStrategy):
+    name = 'go-back-N'
+    template = 'go-back-N.html'
+
+    def receiver_event(self, accepted, ack):
+        # out of order frames are shown as rejected
+        return 'sendPacketToReceiverFrontend' if accepted else 'sendRejectedPacketToReceiverFrontend'
+
+
+class SelectiveRepeatStrategy(ProtocolStrategy):
+    name = 'selective-repeat'
+    template = 'selective-repeat.html'
+    sack = True
+
+
+# ################################# Protocol namespace #####################################
+
+class ProtocolNamespace(Namespace):
+    """
+    Objective : every socket.io event of one protocol page
+    Approach  : flask_socketio dispatches event X to on_X. One instance per protocol,
+                see register_protocol().
+    """
+
+    def __init__(self, strategy):
+        super(ProtocolNamespace, self).__init__('/' + strategy.name)
+        self.strategy = strategy
+
+    def trigger_event(self, event, *args):
+        """
+        Task : dispatch to on_<event>, and time it. Events without a handler are not timed,
+               so clients cannot invent label values
+        """
+        if not hasattr(self, 'on_' + event):
+            return
+        started = default_timer()
+        try:
+            return super(ProtocolNamespace, self).trigger_event(event, *args)
+        finally:
+            HANDLER_SECONDS.labels(self.namespace, event).observe(default_timer() - started)
+
+    # ################################# Establish Connection  #####################################
+
+    def on_connect(self):
+        """
+        From : Predefined event connect. Called when server comes alive.
+        Task : Initialise protocol state of this connection
+        To   : Server start message at frontend
+        """
+        # the wire format goes in before open() writes the session through to the store
+        state = sessions.open(request.sid, request.namespace, request.args.get('seed', type=int),
+                              wire.BINARY if request.args.get('wire') == wire.BINARY else wire.JSON)
+        emit('server_started', {'wire': state.wire, 'seed': state.channel.seed})
+
+    def on_connectionRequestToMiddleLayerBackend(self, message):
+        """
+        From : Receiver frontend after receiver said hi to sender
+        Task : Simply pass data from receiver front end to middle layer frontend
+        To   : Middle layer frontend - to display log
+        """
+        emit('connectionRequestToMiddleLayerFrontend', {'data': message['data']})
+
+    def on_connectionRequestToSenderBackend(self, message):
+        """
+        From : Middle layer frontend
+        Task : If receiver greets, then all good. Else, fail connection
+        To   : Sender frontend - to display log
+        """
+        if message['data'] == 'Hi Sender!':
+            emit('connectionRequestToSenderFrontend', {
+                'data': 'Connection established. Hello Receiver!'})
+        else:
+            emit('connection_failure', {'data': 'Connection denied, Retry!'})
+
+    # ###################################### Ping Pong #######################################
+
+    def on_HeyPing(self):
+        """
+        From : ping
+        Task : simply emit pong and help in roundtrip latency calculation
+        To   : pong
+        """
+        emit('HeyPong')
+
+    # ###################################### Transmission #######################################
+
+    def on_sendPacketToSenderBackendBurst(self, message):
+        """
+        From : Sender Input form
+        Task : size the sliding window and load every packet.
+               With reversePackets, the receiver sends that many back at the same time, see arq/duplex.py
+        To   : send the first window to sender frontend, as one message. The way back to receiver frontend
+        """
+        state = arq_session()
+        sender = state.sender
+        sender.window_size = state.receiver.window_size = int(message['windowSize'])
+        reversePackets = int(message.get('reversePackets') or 0)
+        if reversePackets:
+            state.duplex = Duplex(state.protocol, sender.window_size, SEQUENCE_BITS)
+        slidingWindow = sender.load(int(message['totalNumberOfPackets']))
+        log_event(logging.INFO, 'burst', window=sender.window_size, total=sender.total, reverse=reversePackets)
+        # the whole window goes out as one message, the frontend spaces the packets out
+        send_packets_to_sender_frontend(slidingWindow, BURST_SPACING)
+        if reversePackets:
+            send_reverse_packets(state, state.duplex.sender.load(reversePackets), BURST_SPACING)
+
+    def on_sendPayloadToSenderBackend(self, message):
+        """
+        From : Sender Input form, payload mode
+        Task : cut a byte stream into frames of `mtu` bytes, the uploaded `data` or `size` generated
+               bytes (reproducible with `seed`). The receiver puts them back together, see arq/payload.py
+        To   : send the first window to sender frontend, as one message
+        """
+        state = arq_session()
+        data = message.get('data')
+        if data is None:
+            size = int(message.get('size') or 0)
+            data = generate_payload(size, message.get('seed')) if 0 < size <= PAYLOAD_MAX else b''
+        elif not isinstance(data, (bytes, bytearray)):
+            # an upload arrives as a binary attachment, text is not a payload
+            emit('sendPayloadRefusedToSenderFrontend', {'data': 'Payload refused : data must be bytes'})
+            return
+        mtu = min(int(message.get('mtu') or PAYLOAD_MTU), 0xFFFF)
+        if not 0 < len(data) <= PAYLOAD_MAX or mtu < 1 or state.sender.total:
+            emit('sendPayloadRefusedToSenderFrontend', {
+                'data': 'Payload refused : 1 to %d bytes, mtu 1 to 65535, on a fresh connection' % PAYLOAD_MAX})
+            return
+        state.outgoing = Segmenter(data, mtu)
+        state.incoming = Reassembler(state.outgoing.size, mtu)
+        sender = state.sender
+        sender.window_size = state.receiver.window_size = int(message.get('windowSize') or 1)
+        slidingWindow = sender.load(state.outgoing.frames)
+        log_event(logging.INFO, 'payload', size=state.outgoing.size, mtu=mtu, frames=sender.total,
+                  window=sender.window_size)
+        send_packets_to_sender_frontend(slidingWindow, BURST_SPACING)
+
+    def on_sendPacketToSenderBackend(self, message):
+        """
+        From : Sender Input form OR retransmissions
+        Task : pick the packet(s) the request stands for, see ProtocolStrategy.requested_packets
+        To   : send Packet to sender frontend
+        """
+        message = wire.decode(message)
+        packetNumbers, labels = self.strategy.requested_packets(arq_session().sender, message)
+        log_event(logging.DEBUG, 'send_request', seq=packetNumbers[0] if packetNumbers else None)
+        send_packets_to_sender_frontend(packetNumbers, labels=labels)
+
+    def on_packetTimerBlast(self, message):
+        """
+        From : Sender frontend timer, optional. The server arms its own retransmission timers.
+        Task : If the acknowledgement of previous packet is successfully received. All good.
+               else, re transmit whatever the sender state machine wants resent
+        To   : Sender frontend
+
+        Case : Missing Packet case
+        Explanation : The packet never reached the receiver, so it was never acked.
+
+        Case : Missing acknowledgement case
+        Explanation : Ack is sent from receiver side, but is never reached at sender.
+        The sender state machine never saw the ack, so it still holds the packet.
+
+        Go back N : any packet overdue resends the whole window, from the oldest one.
+        """
+        state = arq_session()
+        message = wire.decode(message, raw=state.outgoing is not None)
+        packetNumber = state.sender.unwrap(int(message['currentPacket']))
+        resend = state.sender.on_timeout(packetNumber)
+        back_off(state, resend)
+        log_event(logging.INFO, 'frontend_timeout', seq=packetNumber, resend=list(resend))
+        send_packets_to_sender_frontend(resend, labels={packetNumber: message['data']}, cause='timeout')
+
+    def on_SendPacketToMiddleLayerBackend(self, message):
+        """
+        From : sender frontend
+        Task : run the frame through the channel model, after some visual delay
+        To   : Middle layer frontend
+        """
+        pass_frame_through_channel(wire.decode(message, raw=arq_session().outgoing is not None))
+
+    def on_sendPacketToReceiverBackend(self, message):
+        """
+        From : Middle layer frontend
+        Task : hand the packet to the receiver state machine, show what it made of it
+        To   : Receiver frontend
+        """
+        state = arq_session()
+        message = wire.decode(message, raw=state.incoming is not None)
+        if not frame_intact(state, message, self.strategy.naks):
+            return
+        receiver = state.receiver
+        packetNumber = receiver.unwrap(int(message['currentPacket']))
+        accepted, ack = receiver.on_frame(packetNumber, message['data'])
+        if len(receiver.run) > 1:
+            # a hole filled, everything buffered behind it went up in one batch
+            log_event(logging.DEBUG, 'delivered', first=receiver.run[0][0], count=len(receiver.run))
+        data = message['data']
+        if state.incoming is not None:
+            receive_payload(state, packetNumber, data, accepted)
+            # the receiver frontend shows the frame, it does not need its bytes
+            data = '%d bytes' % len(data)
+        if state.duplex is not None:
+            # no ack of its own, it waits for a frame going back. Owed first, so the frames
+            # the piggybacked ack lets out can carry it
+            if ack is not None:
+                owe_ack(state, ack, reverse=False)
+            if message.get('currentAck') is not None:
+                reverse_ack_arrived(state, int(message['currentAck']))
+            return
+        event = self.strategy.receiver_event(accepted, ack)
+        if ack is not None and self.strategy.coalesce and ACK_EVERY > 1:
+            # the frontend shows the frame without acking it, the ack leaves coalesced
+            coalesce_ack(state, ack)
+            ack = None
+        if event is None:
+            return
+        display = {
+            'data': data,
+            'currentPacket': message['currentPacket'],
+            'currentAck': receiver.space.wrap(ack) if ack is not None else None}
+        if ack is not None and self.strategy.sack:
+            # the receiver frontend passes them on with its ack
+            display['sack'] = [(receiver.space.wrap(first), receiver.space.wrap(last))
+                               for first, last in receiver.sack()]
+        emit(event, to_wire(display))
+
+    def on_sendAckToMiddleLayerBackend(self, message):
+        """
+        From : Receiver frontend
+        Task : run the ack through the channel model, after some visual delay
+        To   : Middle layer frontend
+        """
+        message = wire.decode(message)
+        # a frame shown while its ack was coalesced has none to pass on
+        if message.get('currentAck') is not None:
+            pass_ack_through_channel(message, nak=self.strategy.naks)
+
+    def on_sendAckToSenderBackend(self, message):
+        """
+        From : Middle Layer frontend
+        Task : Pass on the message and ackNumber, slide the window
+        To   : Sender frontend
+        """
+        message = wire.decode(message)
+        emit('sendAckToSenderFrontend', to_wire({
+            'data': message['data'], 'currentAck': message['currentAck']}))
+        ack_arrived(arq_session(), int(message['currentAck']), message.get('sack'))
+
+    def on_sendNegAckToSenderBackend(self, message):
+        """
+        From : Middle Layer frontend
+        Task : Pass on the message and ackNumber, resend what the sender wants resent
+        To   : Sender frontend
+        """
+        message = wire.decode(message)
+        emit('sendNegAckToSenderFrontend', to_wire({
+            'data': message['data'], 'currentPacket': message['currentPacket'], 'currentAck': message['currentAck']}))
+
+        sender = arq_session().sender
+        send_packets_to_sender_frontend(sender.on_nak(sender.unwrap(int(message['currentPacket']))), cause='nak')
+
+    # ################################# Two way transfers #################################
+
+    def on_SendReversePacketToMiddleLayerBackend(self, message):
+        """
+        From : receiver frontend, a frame of the way back
+        Task : run the frame through the channel model, after some visual delay
+        To   : Middle layer frontend
+        """
+        pass_frame_through_channel(wire.decode(message), reverse=True)
+
+    def on_sendReversePacketToSenderBackend(self, message):
+        """
+        From : Middle layer frontend
+        Task : hand a frame of the way back to its receiver, owe the ack, then act on the
+               ack for the session sender it carries
+        To   : Sender frontend, when the ack lets more frames out
+        """
+        state = arq_session()
+        message = wire.decode(message)
+        # the way back has no negative acks, a garbled frame is left to its timer
+        if state.duplex is None or not frame_intact(state, message, False):
+            return
+        receiver = state.duplex.receiver
+        accepted, ack = receiver.on_frame(receiver.unwrap(int(message['currentPacket'])), message['data'])
+        if ack is not None:
+            owe_ack(state, ack, reverse=True)
+        if message.get('currentAck') is not None:
+            ack_arrived(state, int(message['currentAck']))
+
+    def on_sendReverseAckToReceiverBackend(self, message):
+        """
+        From : Middle layer frontend, an ack of the way back that went on its own
+        Task : slide the window of the way back
+        To   : Receiver frontend
+        """
+        state = arq_session()
+        if state.duplex is not None:
+            message = wire.decode(message)
+            reverse_ack_arrived(state, int(message['currentAck']), message.get('sack'))
+
+    # ################################# Disconnection events #################################
+
+    def on_disconnect_request(self, message):
+        """
+        From : User requested connection termination
+        Task : Tie the loose ends, the call the disconnect() event
+        To   : disconnection frontend
+        """
+        emit('disconnecting_confirmation', {
+            'data': message['data'] + 'Disconnected!'})
+
+    def on_disconnect(self):
+        """
+        From : predefined disconnect event
+        Task : Disconnect the server from client, drop its protocol state and timers
+        To   : None. Print logs to console.
+        """
+        sessions.close(request.sid, request.namespace)
+        log_event(logging.INFO, 'disconnect')
+
+
+# ############################ Registering protocols #####################################
+
+# strategy of every served protocol, by name
+PROTOCOL_STRATEGIES = {}
+
+
+def register_protocol(strategy):
+    """
+    Task : serve a protocol : its socket.io namespace and its page, both at /<name>.
+           A new protocol needs its state machines in arq.PROTOCOLS, a template
+           and a ProtocolStrategy, nothing more.
+    """
+    PROTOCOL_STRATEGIES[strategy.name] = strategy
+    socketio.on_namespace(ProtocolNamespace(strategy))
+
+    def page():
+        """
+        From : User navigates to "localhost:5000/<name>" in a new tab
+        Task : Serve the protocol's template to user
+        To   : None. Wait for events to start.
+        """
+        return render_template(strategy.template, async_mode=socketio.async_mode)
+    app.add_url_rule('/' + strategy.name, strategy.name, page)
+
+
+for strategy in (StopAndWaitStrategy(), GoBackNStrategy(), SelectiveRepeatStrategy()):
+    register_protocol(strategy)
 
-# Server disconnected
-@socketio.on('disconnect', namespace='/go-back-N')
-def gbn_test_disconnect():
-    """
-    From : predefined disconnect event
-    Task : Disconnect the server from client
-    To   : None. Print logs to console.
-    """
-    print('Receiver disconnected', request.sid)
 
-# ########################### serve stop and wait #############################
+# ############################ Serving index #####################################
 
-@app.route('/go-back-N')
-def gbn_go_back_N():
+# when namespaces are ready - change it to @app.route('/selective-repeat')
+@app.route('/')
+def index():
     """
     From : User navigates to "localhost:5000" in a new tab
     Task : Serve the "templates/index.html" page to user
     To   : None. Wait for events to start.
     """
-    return render_template('go-back-N.html', async_mode=socketio.async_mode)
-
-
-# ########################### serving selective repeat events #############################
-
-
-# ################################# Establish Connection  #####################################
-
-# Accepting connection from client
-@socketio.on('connect', namespace='/selective-repeat')
-def sr_server_coming_alive():
-    """
-    From : Predefined event connect. Called when server comes alive.
-    Task : Initialise session variables
-    To   : Server start message at frontend
-    """
-    session['currentPacket'] = 0
-    session['currentAck'] = 0
-    session['expectedAck'] = 0
-    session['receivedAcks'] = []
-    emit('server_started')
-    # emit('complete_connection', {'data': 'Hi Receiver!'})
-
-
-@socketio.on('connectionRequestToMiddleLayerBackend', namespace='/selective-repeat')
-def sr_connection_request_to_middle_layer_backend(message):
-    """
-    From : Receiver frontend after receiver said hi to sender
-    Task : Simply pass data from receiver front end to middle layer frontend
-    To   : Middle layer frontend - to display log
-    """
-    emit('connectionRequestToMiddleLayerFrontend', {'data': message['data']})
-
-
-@socketio.on('connectionRequestToSenderBackend', namespace='/selective-repeat')
-def sr_connection_request_to_sender_backend(message):
-    """
-    From : Middle layer frontend
-    Task : If receiver greets, then all good. Else, fail connection
-    To   : Sender frontend - to display log
-    """
-    if message['data'] == 'Hi Sender!':
-        emit('connectionRequestToSenderFrontend', {
-            'data': 'Connection established. Hello Receiver!'})
-    else:
-        emit('connection_failure', {'data': 'Connection denied, Retry!'})
-
-
-# ###################################### Ping Pong #######################################
-
-@socketio.on('HeyPing', namespace='/selective-repeat')
-def sr_ping_pong():
-    """
-    From : ping
-    Task : simply emit pong and help in roundtrip latency calculation 
-    To   : pong
-    """
-    emit('HeyPong')
-
-
-# ###################################### Transmission #######################################
-
-
-@socketio.on('sendPacketToSenderBackendBurst', namespace='/selective-repeat')
-def sr_handling_packet_at_sender_backend_in_burst_mode(message):
-    """
-    From : Sender Input form OR retransmissions
-    Task : initialise session variables
-    To   : send Packet to sender frontend
-    """
-    print("Burst Mode Active. Initialise sliding window.")
-    # print(message)
-    initial = int(session.get('currentPacket', 0 )) + 1
-    session['totalNumberOfPackets'] = int(message['totalNumberOfPackets']) + int(session.get('currentPacket', 0))
-    session['slidingWindow'] = [ i+initial for i in range(int(message['windowSize']))]
-
-    print(session['slidingWindow'])
-    for packetNumber in session['slidingWindow']:
-        sr_handling_packet_at_sender_backend({
-            'currentPacketNumber' : packetNumber
-        })
-        time.sleep(.05)
-
-
-@socketio.on('sendPacketToSenderBackend', namespace='/selective-repeat')
-def sr_handling_packet_at_sender_backend(message):
-    """
-    From : Sender Input form OR retransmissions
-    Task : initialise session variables
-    To   : send Packet to sender frontend
-    """
-    # session['currentPacket'] = session.get('currentPacket',0) + 1
-
-    session['currentPacket'] = message["currentPacketNumber"]
-    print("now ", session['currentPacket'])
-    emit('sendPacketToSenderFrontend', {
-        'data': 'D' + str(session['currentPacket']),
-        'currentPacket': session['currentPacket']})
-    session['expectedAck'] = session['currentPacket']
-    
-
-@socketio.on('packetTimerBlast', namespace='/selective-repeat')
-def sr_handling_timer_Blast_from_sender(message):
-    """
-    From : Sender Timer
-    Task : If the acknowledgement of previous packet is successfully received. All good.
-           else, re transmit the message 
-    To   : Middle layer frontend
-    """
-    print("Timer Blasted for Packet #", message['currentPacket'])
-    """
-    Case : Missing Packet case
-    Explanation : If current packet ( whose timer blasts after 2 seconds ) 
-    is still greater (even after 2 seconds ) than 
-    packets received by receiver (who should have received atleast 2 more in 2 seconds)
-    then something is wrong. Retransmit.
-
-    Case : Missing acknowledgement case
-    Explanation : Ack is incremented from receiver side, but is never reached at sender.
-    so we decrement the session currentAck whenever ack crashes at middle layer
-    that way, currentExpectedAck (equal to currentPack for stop and wait) 
-    is always > currentAck
-
-    Assumption : packet always come in sorted order
-
-    """
-    print("received yet", session['receivedAcks'])
-    if message['currentPacket'] not in session['receivedAcks']:
-        print("Resending Packet number", message['currentPacket'])
-        emit('sendPacketToSenderFrontend', {
-            'data': message['data'], 'currentPacket': message['currentPacket']})
-    else:
-        print("No issues. Packet number", message['currentPacket'], "successful.")
-
-
-@socketio.on('SendPacketToMiddleLayerBackend', namespace='/selective-repeat')
-def sr_handling_packet_at_middle_layer_backend(message):
-    """
-    From : sender frontend
-    Task : provide some visual delay
-    To   : Middle layer frontend
-    """
-    time.sleep(.05)
-    emit('SendPacketToMiddleLayerFrontend', {
-        'data': message['data'], 'currentPacket': message['currentPacket']})
-    time.sleep(.05)
-
-
-@socketio.on('PackedCrashedAtMiddleLayer', namespace='/selective-repeat')
-def sr_handling_packet_crash_at_middle_layer():
-    """
-    From : Middle Layer frontend
-    Task : handle packet crash and display debug log at frontend
-    To   : Receiver frontend for debug log
-    """
-    emit('packedNotReceivedByReceiver')
-
-
-@socketio.on('sendPacketToReceiverBackend', namespace='/selective-repeat')
-def sr_handling_packet_at_receiver_backend(message):
-    """
-    From : Middle layer frontend
-    Task : packet successfully received. Increment the ackNumber to be sent.
-    To   : Receiver frontend
-    """
-    session['currentAck'] = int(message['currentPacket'])
-    emit('sendPacketToReceiverFrontend', {
-        'data': message['data'], 
-        'currentPacket': message['currentPacket'], 
-        'currentAck': session['currentAck']
-        })
+    return render_template('index.html', async_mode=socketio.async_mode)
 
 
-@socketio.on('sendAckToMiddleLayerBackend', namespace='/selective-repeat')
-def sr_handling_ack_at_middle_layer_backend(message):
+@app.route('/healthz')
+def healthz():
     """
-    From : Receiver frontend
-    Task : packet successfully received. Increment the ackNumber to be sent
-    To   : Middle layer frontend
+    From : Load balancer / uptime checks
+    Task : Report that this worker is up, and what it is carrying
+    To   : None. JSON response.
     """
-    time.sleep(.05)
-    emit('sendAckToMiddleLayerFrontend', {
-        'data': message['data'],
-        'currentPacket' : message['currentPacket'],
-         'currentAck': message['currentAck']})
-    time.sleep(.05)
-
+    return jsonify(status='ready', async_mode=socketio.async_mode, pid=os.getpid(),
+                   sessions=len(sessions), pending_emits=len(channel))
 
-@socketio.on('AckCrashedAtMiddleLayer', namespace='/selective-repeat')
-def sr_handling_ack_crash_at_middle_layer(message):
-    """
-    From : Middle Layer frontend
-    Task : handle Ack crash and display debug log at frontend
-    To   : Sender frontend for debug log
-    """
-    session['currentAck'] = int(session['currentAck'])-1 
-    print("Ack #", message['currentAck'], "crashed.")
-    emit('ackNotReceivedBySender', {
-        'currentAck': message['currentAck']
-    })
-    
 
-@socketio.on('sendAckToSenderBackend', namespace='/selective-repeat')
-def sr_handling_ack_at_sender_backend(message):
+@app.route('/metrics')
+def metrics_endpoint():
     """
-    From : Middle Layer frontend
-    Task : Pass on the message and ackNumber
-    To   : Sender frontend
+    From : Prometheus scrape
+    Task : handler latency, frame round trips, retransmissions, window use and sessions of this worker
+    To   : None. Text exposition format.
     """
-    emit('sendAckToSenderFrontend', {
-        'data': message['data'], 'currentAck': message['currentAck']})
-    
-    # slide window as well
-    # actual sliding will be probelmatic, so i just send next packet
-    session['receivedAcks'].append(int(message['currentPacket']))
-
-    print("Nice job bro")
-    if( int(session['currentPacket']) < int(session['totalNumberOfPackets'])):
-        print("keep it up")
-        sr_handling_packet_at_sender_backend({
-            'currentPacketNumber' : int(session['currentPacket']) + 1
-        })
-    else:
-        # all done
-        emit('sendCompletionMessage')
-
+    return metrics.render(), 200, {'Content-Type': CONTENT_TYPE}
 
-@socketio.on('sendNegAckToSenderBackend', namespace='/selective-repeat')
-def sr_handling_negative_ack_at_sender_backend(message):
-    """
-    From : Middle Layer frontend
-    Task : Pass on the message and ackNumber
-    To   : Sender frontend
-    """
-    emit('sendNegAckToSenderFrontend', {
-        'data': message['data'], 'currentPacket': message['currentPacket'] , 'currentAck': message['currentAck']})
-    
-    # slide window as well
-    # actual sliding will be probelmatic, so i just send next packet
-    
-    sr_handling_packet_at_sender_backend({
-        'currentPacketNumber' : int(message['currentPacket'])
-    })
 
+# biggest sweep one request may ask for, in array cells, see montecarlo.sweep_cost. About 20 s at worst,
+# the default grid is 4.25e8
+SWEEP_BUDGET = int(os.environ.get('SWEEP_BUDGET', 1000000000))
 
-# ################################# Disconnection events #################################
 
-# Requesting termination of connection
-@socketio.on('disconnect_request', namespace='/selective-repeat')
-def sr_handling_disconnect_request_at_backend(message):
+def run_off_hub(function, *args):
     """
-    From : User requested connection termination
-    Task : Tie the loose ends, the call the disconnect() event
-    To   : disconnection frontend
+    Task : run a CPU bound call in a native thread, so the gevent / eventlet hub keeps
+           serving every other connection of this process meanwhile. Under threading it just runs
+    To   : what function(*args) returns, or raises
     """
-    emit('disconnecting_confirmation', {
-        'data': message['data'] + 'Disconnected!'})
+    if socketio.async_mode == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(function, args)
+    if socketio.async_mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(function, *args)
+    return function(*args)
 
 
-# Server disconnected
-@socketio.on('disconnect', namespace='/selective-repeat')
-def sr_test_disconnect():
+@app.route('/api/sweep')
+def api_sweep():
     """
-    From : predefined disconnect event
-    Task : Disconnect the server from client
-    To   : None. Print logs to console.
+    From : GET /api/sweep?protocols=go-back-N&windows=1,4,16&losses=0,0.1&rtts=8&timeouts=16,32&frames=200&trials=10
+    Task : Monte Carlo throughput / goodput / retransmissions for every combination, see arq/montecarlo.py.
+           A run gives up after max_slots, the same default as the CLI, and the worst case
+           of the whole grid has to fit SWEEP_BUDGET
+    To   : None. JSON response, {"rows": [...]}
     """
-    print('Receiver disconnected', request.sid)
+    from arq import montecarlo
 
+    def numbers(name, kind, default):
+        text = request.args.get(name)
+        return tuple(kind(part) for part in text.split(',') if part) if text else default
 
+    try:
+        protocols = numbers('protocols', str, montecarlo.PROTOCOL_NAMES)
+        windows = numbers('windows', int, (1, 2, 4, 8, 16))
+        losses = numbers('losses', float, (0.0, 0.01, 0.05, 0.1, 0.2))
+        rtts = numbers('rtts', int, (4, 16))
+        timeouts = numbers('timeouts', int, (None,))
+        frames = int(request.args.get('frames', 200))
+        trials = int(request.args.get('trials', 10))
+        ack_loss = request.args.get('ack_loss', type=float)
+        seed = request.args.get('seed', type=int)
+        maxSlots = request.args.get('max_slots')
+        maxSlots = int(maxSlots) if maxSlots else montecarlo.default_max_slots(frames, rtts)
+        cost = montecarlo.sweep_cost(protocols, windows, losses, rtts, timeouts, frames, trials, ack_loss, maxSlots)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    if cost > SWEEP_BUDGET:
+        return jsonify(error='sweep too large, %d cells at worst is over %d, ask for fewer combinations,'
+                             ' frames or max_slots' % (cost, SWEEP_BUDGET)), 400
+    try:
+        # seconds of numpy, the socket.io connections on this process must not wait for it
+        rows = run_off_hub(montecarlo.sweep, protocols, windows, losses, rtts, timeouts, frames, trials,
+                           ack_loss, seed, maxSlots)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    except RuntimeError as error:
+        return jsonify(error=str(error)), 501
+    return jsonify(rows=rows)
 
-# ########################### serve selective repeat #############################
 
-@app.route('/selective-repeat')
-def sr_selective_repeat():
-    """
-    From : User navigates to "localhost:5000" in a new tab
-    Task : Serve the "templates/index.html" page to user
-    To   : None. Wait for events to start.
-    """
-    return render_template('selective-repeat.html', async_mode=socketio.async_mode)
-
-
-
-# ############################ Serving index #####################################
+# ################################# Main function #####################################
 
-# when namespaces are ready - change it to @app.route('/selective-repeat')
-@app.route('/')
-def index():
+def run_dev_server(page='/'):
     """
-    From : User navigates to "localhost:5000" in a new tab
-    Task : Serve the "templates/index.html" page to user
-    To   : None. Wait for events to start.
+    Task : Keep the dev server running on $PORT (default 5000), server.py is the production entry point
     """
-    return render_template('index.html', async_mode=socketio.async_mode)
-
+    port = int(os.environ.get('PORT', 5000))
+    if ARQ_LOG_LEVEL is None:
+        events.configure('INFO', ARQ_LOG_SAMPLE)
+    print('serving http://localhost:%d%s' % (port, page))
+    socketio.run(app, host="0.0.0.0", port=port, debug=False)
 
 
-# ################################# Main function #####################################
-import os
-
 # Start the app : dev mode
 if __name__ == '__main__':
-    """
-    Event : Start the server
-    Task  : Keep the server running, debugging ON in dev mode
-    """
-    portis = os.environ.get('PORT')
-    if(portis == None):
-        portis = 5000
-    else:
-        portis = int(portis)
-    print(portis)
-    socketio.run(app, host= "0.0.0.0", port= portis, debug=False)
+    run_dev_server()
 
 # ######################################################################################
\ No newline at end of file
@@ -0,0 +1,23 @@
+"""
+Headless ARQ protocols : state machines for stop and wait, go back N and
+selective repeat, and a discrete event simulator to run them offline.
+The socket handlers in app.py drive the very same state machines.
+"""
+from .protocols import (PROTOCOLS, make_endpoints,
+                        StopAndWaitSender, StopAndWaitReceiver,
+                        GoBackNSender, GoBackNReceiver,
+                        SelectiveRepeatSender, SelectiveRepeatReceiver)
+from .engine import Simulator, Result, simulate
+from .scheduler import DelayScheduler
+from .channel import Link, ChannelModel, channel_from_config
+from .acks import AckWindow, UnackedFrames, ack_ranges
+from .seqspace import SequenceSpace
+from .timers import TimerWheel
+from .rto import RtoEstimator
+from .payload import Segmenter, Reassembler
+from .duplex import Duplex, OwedAcks
+from .state import ArqSession, SessionRegistry
+from .store import MemoryStore, RedisStore, store_from_url
+from .eventlog import EventLog
+from .metrics import Registry
+from . import wire
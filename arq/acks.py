@@ -0,0 +1,236 @@
+"""
+Acknowledgement bookkeeping for a sliding window sender.
+
+Replaces the ever growing `receivedAcks` list : everything below `base` is
+known to be acked, and the frames inside the window are one bit each in a
+ring shaped bitmap. Lookups and acks are O(1), sliding is amortised O(1),
+and the whole thing serialises to a handful of bytes.
+
+Go back N only ever acks cumulatively, so it keeps its unacked frames in an
+UnackedFrames ring instead, where an ack just moves base.
+"""
+import struct
+
+_HEADER = struct.Struct('>QQH')
+
+
+def ack_ranges(acks):
+    """
+    Task : frame numbers in any order -> sorted (first, last) runs, e.g. 3 5 4 7 -> (3, 5) (7, 7).
+           How one message acks many frames at once
+    """
+    ranges = []
+    for seq in sorted(set(acks)):
+        if ranges and seq == ranges[-1][1] + 1:
+            ranges[-1][1] = seq
+        else:
+            ranges.append([seq, seq])
+    return [tuple(run) for run in ranges]
+
+
+class AckWindow(object):
+    """
+    Objective : answer "is frame `seq` acked ?" for a window of `capacity` frames
+    Approach  : bit (seq % capacity) of `bits` is set once seq is acked.
+                When the bit of `base` is set, base slides forward and clears it,
+                so the slot is free for frame base + capacity.
+    """
+    __slots__ = ('base', 'highest', 'capacity', 'bits')
+
+    def __init__(self, capacity=8, base=1):
+        self.base = base
+        # highest frame acked so far, 0 for none
+        self.highest = base - 1
+        self.capacity = max(8, (capacity + 7) & ~7)
+        self.bits = bytearray(self.capacity >> 3)
+
+    def __contains__(self, seq):
+        if seq < self.base:
+            return True
+        if seq >= self.base + self.capacity:
+            return False
+        slot = seq % self.capacity
+        return bool(self.bits[slot >> 3] & (1 << (slot & 7)))
+
+    def __len__(self):
+        """ frames acked above base, waiting for the hole at base to fill """
+        return sum(bin(byte).count('1') for byte in self.bits)
+
+    def add(self, seq):
+        """
+        Task : mark one frame acked, then slide over every acked frame at base
+        To   : True if the ack was new
+        """
+        if seq < self.base or seq >= self.base + self.capacity:
+            return False
+        bits = self.bits
+        capacity = self.capacity
+        slot = seq % capacity
+        mask = 1 << (slot & 7)
+        if bits[slot >> 3] & mask:
+            return False
+        bits[slot >> 3] |= mask
+        if seq > self.highest:
+            self.highest = seq
+        self._slide()
+        return True
+
+    def add_ranges(self, ranges):
+        """
+        Task : mark every frame of (first, last) ranges acked, SACK blocks, then slide once.
+               Frames outside the window are skipped, they were acked before or were never sent
+        To   : the frames that were not acked before
+        """
+        bits = self.bits
+        capacity = self.capacity
+        base = self.base
+        new = []
+        for first, last in ranges:
+            for seq in range(max(first, base), min(last, base + capacity - 1) + 1):
+                slot = seq % capacity
+                mask = 1 << (slot & 7)
+                if not bits[slot >> 3] & mask:
+                    bits[slot >> 3] |= mask
+                    new.append(seq)
+        if new:
+            self.highest = max(self.highest, max(new))
+            self._slide()
+        return new
+
+    def _slide(self):
+        bits = self.bits
+        capacity = self.capacity
+        base = self.base
+        slot = base % capacity
+        while bits[slot >> 3] & (1 << (slot & 7)):
+            bits[slot >> 3] &= ~(1 << (slot & 7))
+            base += 1
+            slot = base % capacity
+        self.base = base
+
+    def advance_to(self, seq):
+        """
+        Task : cumulative ack, every frame up to and including `seq` is acked
+        To   : True if base moved
+        """
+        if seq < self.base:
+            return False
+        if seq - self.base >= self.capacity:
+            self.bits[:] = bytes(len(self.bits))
+            self.base = seq + 1
+        else:
+            bits = self.bits
+            capacity = self.capacity
+            for done in range(self.base, seq + 1):
+                slot = done % capacity
+                bits[slot >> 3] &= ~(1 << (slot & 7))
+            # frames acked out of order right above seq slide in too
+            base = seq + 1
+            slot = base % capacity
+            while bits[slot >> 3] & (1 << (slot & 7)):
+                bits[slot >> 3] &= ~(1 << (slot & 7))
+                base += 1
+                slot = base % capacity
+            self.base = base
+        if seq > self.highest:
+            self.highest = seq
+        return True
+
+    def resize(self, capacity):
+        """
+        Task : change the window size, keeping acks already inside the window
+        """
+        acked = [seq for seq in range(self.base + 1, self.base + self.capacity) if seq in self]
+        base, highest = self.base, self.highest
+        self.__init__(capacity, base)
+        self.highest = highest
+        for seq in acked:
+            self.add(seq)
+
+    # ################################ Serialising #################################
+
+    def to_bytes(self):
+        return _HEADER.pack(self.base, self.highest, self.capacity >> 3) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        base, highest, size = _HEADER.unpack_from(data)
+        window = cls(size << 3, base)
+        window.highest = highest
+        window.bits[:] = data[_HEADER.size:_HEADER.size + size]
+        return window
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        other = AckWindow.from_bytes(state)
+        for name in self.__slots__:
+            setattr(self, name, getattr(other, name))
+
+    def __repr__(self):
+        return '<AckWindow base=%d highest=%d pending=%d>' % (self.base, self.highest, len(self))
+
+
+class UnackedFrames(object):
+    """
+    Objective : the frames a go back N sender still has to get acked, and what they carried
+    Approach  : ring of `capacity` slots, frame seq sits in slot (seq % capacity) as (seq, data).
+                Acks are cumulative, so everything below `base` is acked and a cumulative
+                ack only moves `base`, O(1) however far it jumps. The slots it leaves behind
+                are overwritten by the frames that refill the window.
+    """
+    __slots__ = ('base', 'highest', 'capacity', 'slots')
+
+    def __init__(self, capacity=8, base=1):
+        self.base = base
+        self.highest = base - 1
+        self.capacity = max(8, capacity)
+        self.slots = [None] * self.capacity
+
+    def __contains__(self, seq):
+        return seq < self.base
+
+    def __len__(self):
+        """ nothing above base is ever acked on its own """
+        return 0
+
+    def put(self, seq, data=None):
+        """
+        Task : frame `seq` goes on the wire, keep it for retransmission
+        """
+        self.slots[seq % self.capacity] = (seq, data)
+
+    def data(self, seq):
+        """
+        To : what frame `seq` carried, None when it is acked or was sent without data
+        """
+        entry = self.slots[seq % self.capacity]
+        if entry is None or entry[0] != seq or seq < self.base:
+            return None
+        return entry[1]
+
+    def advance_to(self, seq):
+        """
+        Task : cumulative ack, every frame up to and including `seq` is acked
+        To   : True if base moved
+        """
+        if seq < self.base:
+            return False
+        self.base = seq + 1
+        if seq > self.highest:
+            self.highest = seq
+        return True
+
+    def resize(self, capacity):
+        """
+        Task : change the window size, keeping the frames still unacked
+        """
+        live = [entry for entry in self.slots if entry is not None and entry[0] >= self.base]
+        self.capacity = max(8, capacity)
+        self.slots = [None] * self.capacity
+        for seq, data in live:
+            self.put(seq, data)
+
+    def __repr__(self):
+        return '<UnackedFrames base=%d highest=%d>' % (self.base, self.highest)
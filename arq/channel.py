@@ -0,0 +1,134 @@
+"""
+Seeded model of the unreliable channel between sender and receiver.
+
+The middle layer handlers in app.py ask it what happens to every frame and
+every ack, so drops never need a round trip through the browser and a run
+can be replayed from its seed. Each direction is a Link :
+
+    loss       Bernoulli loss probability, or the loss of the good state
+    gilbert    (p, r, bad_loss) turns the link into a Gilbert-Elliott channel :
+               good -> bad with probability p, bad -> good with probability r,
+               frames are lost with `bad_loss` while in the bad state
+    corrupt    a delivered copy has one bit flipped
+    duplicate  a second copy arrives a little later
+    reorder    a copy is held back long enough for later frames to overtake it
+"""
+import random
+
+
+class Delivery(object):
+    """
+    One copy that makes it across. `delay` is a multiple of the channel delay.
+    """
+    __slots__ = ('delay', 'corrupted')
+
+    def __init__(self, delay=1.0, corrupted=False):
+        self.delay = delay
+        self.corrupted = corrupted
+
+    def __repr__(self):
+        return '<Delivery x%.2f%s>' % (self.delay, ' corrupted' if self.corrupted else '')
+
+
+class Link(object):
+    """
+    Objective : one direction of the channel
+    Approach  : keeps only the Gilbert-Elliott state, randomness comes from the ChannelModel
+    """
+    __slots__ = ('loss', 'corrupt', 'duplicate', 'reorder', 'gilbert', 'bad')
+
+    def __init__(self, loss=0.0, corrupt=0.0, duplicate=0.0, reorder=0.0, gilbert=None):
+        for name, p in (('loss', loss), ('corrupt', corrupt), ('duplicate', duplicate), ('reorder', reorder)):
+            if not 0 <= p <= 1:
+                raise ValueError('%s must be a probability, got %r' % (name, p))
+        if gilbert is not None and len(gilbert) != 3:
+            raise ValueError('gilbert takes (p, r, bad_loss), got %r' % (gilbert,))
+        self.loss = loss
+        self.corrupt = corrupt
+        self.duplicate = duplicate
+        self.reorder = reorder
+        self.gilbert = tuple(gilbert) if gilbert is not None else None
+        self.bad = False
+
+    def lost(self, rng):
+        if self.gilbert is None:
+            return rng.random() < self.loss
+        p, r, bad_loss = self.gilbert
+        self.bad = rng.random() >= r if self.bad else rng.random() < p
+        return rng.random() < (bad_loss if self.bad else self.loss)
+
+    def transmit(self, rng, hold=2.0):
+        """
+        Task : fate of one frame
+        To   : list of Delivery, empty when the frame is lost
+        """
+        if self.lost(rng):
+            return []
+        copies = [Delivery()]
+        if rng.random() < self.duplicate:
+            copies.append(Delivery(1.5))
+        for copy in copies:
+            if rng.random() < self.reorder:
+                copy.delay += hold * (1 + rng.random())
+            copy.corrupted = rng.random() < self.corrupt
+        return copies
+
+
+class ChannelModel(object):
+    """
+    Objective : both directions of one connection, driven by one seeded generator
+    Input Parameters:
+        frames : Link for sender -> receiver
+        acks   : Link for receiver -> sender
+        seed   : None picks one at random, it is kept in self.seed so the run can be repeated
+        hold   : how long a reordered copy is held back, in channel delays
+    """
+
+    def __init__(self, frames=None, acks=None, seed=None, hold=2.0):
+        self.frames = frames if frames is not None else Link()
+        self.acks = acks if acks is not None else Link()
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.hold = hold
+        self.rng = random.Random(self.seed)
+
+    def frame(self):
+        return self.frames.transmit(self.rng, self.hold)
+
+    def ack(self):
+        return self.acks.transmit(self.rng, self.hold)
+
+    def garble(self, data):
+        """
+        Task : flip one bit of the text, so a corrupted copy looks corrupted in the logs.
+               Payload bytes come back as bytes
+        """
+        binary = isinstance(data, (bytes, bytearray, memoryview))
+        raw = bytearray(data) if binary else bytearray(str(data).encode('utf-8'))
+        if not raw:
+            return data
+        i = self.rng.randrange(len(raw))
+        raw[i] ^= 1 << self.rng.randrange(7)
+        return bytes(raw) if binary else raw.decode('utf-8', 'replace')
+
+    def __repr__(self):
+        return '<ChannelModel seed=%d>' % self.seed
+
+
+def channel_from_config(model='bernoulli', loss=0.0, ack_loss=None, corrupt=0.0, ack_corrupt=None,
+                        duplicate=0.0, reorder=0.0, gilbert=None, seed=None):
+    """
+    Task : build a ChannelModel from flat settings, the ack direction defaults to the frame one.
+           model is 'bernoulli' or 'gilbert-elliott', the latter needs gilbert=(p, r, bad_loss)
+    """
+    if model not in ('bernoulli', 'gilbert-elliott'):
+        raise ValueError('unknown channel model %r' % model)
+    if model == 'gilbert-elliott' and gilbert is None:
+        raise ValueError('the gilbert-elliott model needs gilbert=(p, r, bad_loss)')
+    gilbert = gilbert if model == 'gilbert-elliott' else None
+
+    def link(lost, corrupted):
+        return Link(lost, corrupted, duplicate, reorder, gilbert)
+
+    return ChannelModel(link(loss, corrupt),
+                        link(loss if ack_loss is None else ack_loss, corrupt if ack_corrupt is None else ack_corrupt),
+                        seed)
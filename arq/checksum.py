@@ -0,0 +1,81 @@
+"""
+Frame checksums : CRC-32 and CRC-16/CCITT over the frame header and its data.
+
+The channel stamps every frame with a checksum when it enters the middle
+layer, and the receiver recomputes it. A mismatch means the channel garbled
+the frame, the receiver drops it and asks for it again with a negative ack.
+
+    frame_checksum(seq, data)              # CRC-32, zlib
+    frame_checksum(seq, data, 'crc16')     # CRC-16/CCITT-FALSE, binascii
+    crc16_ccitt_table(data)                # the same CRC-16, table driven in python
+
+The header part is the packet number as it goes on the wire, big endian
+uint32, so a frame that kept its data but lost its number fails too. Both
+CRCs are chained over header and data, nothing is concatenated.
+CRC-32 and binascii.crc_hqx run in C. crc16_ccitt_table() is the byte at a time
+table lookup they do, for where neither is at hand and to check them against.
+"""
+import binascii
+import struct
+import zlib
+
+SEQ = struct.Struct('>I')
+
+# CRC-16/CCITT-FALSE : polynomial 0x1021, initial value 0xFFFF, no reflection, no final xor
+CRC16_POLY = 0x1021
+CRC16_INIT = 0xFFFF
+
+
+def _crc16_table(poly):
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return tuple(table)
+
+
+CRC16_TABLE = _crc16_table(CRC16_POLY)
+
+
+def crc16_ccitt_table(data, crc=CRC16_INIT):
+    """
+    Task : CRC-16/CCITT of `data`, one table lookup per byte, carrying on from `crc`
+    """
+    table = CRC16_TABLE
+    for byte in memoryview(data).cast('B'):
+        crc = ((crc << 8) & 0xFF00) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def crc16_ccitt(data, crc=CRC16_INIT):
+    """
+    Task : CRC-16/CCITT of `data`, carrying on from `crc`. binascii.crc_hqx is the same table, in C
+    """
+    return binascii.crc_hqx(data, crc)
+
+
+def crc32(data, crc=0):
+    return zlib.crc32(data, crc)
+
+
+# name -> (function, initial value)
+ALGORITHMS = {
+    'crc32': (crc32, 0),
+    'crc16': (crc16_ccitt, CRC16_INIT),
+}
+
+
+def frame_checksum(seq, data, algorithm='crc32'):
+    """
+    Task : checksum of a frame, its number on the wire then its data.
+           Text data is checksummed as utf-8, the way it goes on the wire
+    """
+    try:
+        crc, value = ALGORITHMS[algorithm]
+    except KeyError:
+        raise ValueError('unknown checksum %r, choose from %s' % (algorithm, ', '.join(sorted(ALGORITHMS))))
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = str(data).encode('utf-8')
+    return crc(data, crc(SEQ.pack(seq), value))
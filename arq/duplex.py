@@ -0,0 +1,102 @@
+"""
+Piggybacked acks, for transfers that go both ways.
+
+With data flowing in both directions, an ack needs no message of its own :
+it rides in the currentAck of the next frame going the other way. An ack
+that finds no such frame within the ack delay goes out on its own, so a
+direction that has gone quiet still gets acked.
+
+    duplex = Duplex('go-back-N', window_size=4)
+    duplex.owed_forward.owe(7)       # the receiver took frame 7 in, True : arm the delayed ack
+    duplex.owed_forward.take()       # -> 7, put it on the next frame of duplex.sender
+    duplex.owed_forward.drain()      # -> [], the delayed ack went off, send these on their own
+    duplex.owed_forward.last         # -> 7, frames with nothing new to carry repeat it
+
+The forward direction is the session's own sender and receiver. Duplex adds
+the way back, a sender at the receiver end and a receiver at the sender end,
+and what each end owes the other.
+
+A one way transfer uses OwedAcks too, when its receiver coalesces acks :
+they pile up until `frames` reaches the ack interval or the delay runs out,
+then leave as one message.
+"""
+from .protocols import make_endpoints
+
+
+class OwedAcks(object):
+    """
+    Objective : acks one end owes the other, waiting for a frame to ride on
+    Approach  : cumulative acks (go back N) collapse into the latest one,
+                selective ones queue up and leave one per frame
+    """
+    __slots__ = ('cumulative', 'acks', 'last', 'frames')
+
+    def __init__(self, cumulative=False):
+        self.cumulative = cumulative
+        self.acks = []
+        # latest ack that left, None before the first one
+        self.last = None
+        # frames acked by what is owed, a cumulative ack stands for several
+        self.frames = 0
+
+    def __len__(self):
+        return len(self.acks)
+
+    def owe(self, ack):
+        """
+        To : True if nothing was owed before, the delayed ack timer starts now
+        """
+        first = not self.acks
+        self.frames += 1
+        if self.cumulative:
+            self.acks = [ack if first else max(ack, self.acks[0])]
+        elif ack not in self.acks:
+            self.acks.append(ack)
+        return first
+
+    def take(self):
+        """
+        To : the ack for the next frame going the other way, None if nothing is owed
+        """
+        if self.acks:
+            self.last = self.acks.pop(0)
+            if not self.acks:
+                self.frames = 0
+            return self.last
+        return None
+
+    def drain(self):
+        """
+        To : everything owed, to send on its own
+        """
+        acks, self.acks = self.acks, []
+        self.frames = 0
+        if acks:
+            self.last = acks[-1]
+        return acks
+
+
+class Duplex(object):
+    """
+    Objective : the way back of one connection
+    Input Parameters:
+        protocol    : key of arq.PROTOCOLS, the same both ways
+        window_size : window of the way back
+        seq_bits    : width of its sequence numbers, see seqspace.py
+    """
+    __slots__ = ('sender', 'receiver', 'owed_forward', 'owed_reverse')
+
+    def __init__(self, protocol, window_size=1, seq_bits=None):
+        self.sender, self.receiver = make_endpoints(protocol, window_size, seq_bits)
+        # held at the receiver end, for frames of the session's sender. They ride on self.sender's frames
+        self.owed_forward = OwedAcks(self.sender.cumulative)
+        # held at the sender end, for frames of self.sender. They ride on the session sender's frames
+        self.owed_reverse = OwedAcks(self.sender.cumulative)
+
+    @property
+    def done(self):
+        return self.sender.done
+
+    def __repr__(self):
+        return '<Duplex base=%d next=%d owed=%d/%d>' % (
+            self.sender.base, self.sender.next_seq, len(self.owed_forward), len(self.owed_reverse))
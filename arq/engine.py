@@ -0,0 +1,201 @@
+"""
+Discrete event simulator for the ARQ protocols.
+
+Runs a sender and a receiver from protocols.py over a lossy channel on a
+virtual clock, so a whole transfer finishes in however long the CPU takes,
+no browser and no sockets needed.
+
+    >>> from arq import simulate
+    >>> simulate('go-back-N', frames=100000, window_size=8, loss=0.1, seed=1)
+"""
+import heapq
+import itertools
+import random
+
+from .protocols import make_endpoints
+from .rto import RtoEstimator
+
+
+# ################################## Event loop #####################################
+
+class Simulator(object):
+    """
+    Objective : a plain event heap ordered by (time, insertion order)
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self._queue = []
+        self._order = itertools.count()
+
+    def schedule(self, delay, callback, *args):
+        heapq.heappush(self._queue, (self.now + delay, next(self._order), callback, args))
+
+    def run(self, until=None):
+        queue = self._queue
+        pop = heapq.heappop
+        while queue:
+            if until is not None and queue[0][0] > until:
+                self.now = until
+                return
+            self.now, _, callback, args = pop(queue)
+            callback(*args)
+
+
+# ################################## Results #####################################
+
+class Result(object):
+    """
+    Counters of one simulated transfer. `elapsed` is in the same unit as `delay`.
+    """
+    __slots__ = ('protocol', 'frames', 'delivered', 'transmissions', 'retransmissions',
+                 'duplicates', 'acks', 'elapsed')
+
+    def __init__(self, protocol, frames):
+        self.protocol = protocol
+        self.frames = frames
+        self.delivered = 0
+        self.transmissions = 0
+        self.retransmissions = 0
+        # copies of frames the receiver already had, resent for nothing
+        self.duplicates = 0
+        self.acks = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """ frames put on the wire per unit time """
+        return self.transmissions / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def goodput(self):
+        """ frames delivered in order per unit time """
+        return self.delivered / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def efficiency(self):
+        return self.delivered / self.transmissions if self.transmissions else 0.0
+
+    def as_dict(self):
+        result = {name: getattr(self, name) for name in self.__slots__}
+        result.update(throughput=self.throughput, goodput=self.goodput, efficiency=self.efficiency)
+        return result
+
+    def __repr__(self):
+        return '<Result %s delivered=%d transmissions=%d retransmissions=%d elapsed=%.2f>' % (
+            self.protocol, self.delivered, self.transmissions, self.retransmissions, self.elapsed)
+
+
+# ################################## Simulation #####################################
+
+def simulate(protocol, frames, window_size=8, loss=0.0, ack_loss=None, delay=1.0,
+             timeout=None, seed=None, sender=None, receiver=None, seq_bits=None,
+             jitter=0.0, adaptive=False):
+    """
+    Objective : run one transfer of `frames` frames to completion
+    Input Parameters:
+        protocol    : 'stop-and-wait', 'go-back-N' or 'selective-repeat'
+        loss        : probability that a frame is lost on the way
+        ack_loss    : probability that an ack is lost, defaults to `loss`
+        delay       : one way propagation delay
+        timeout     : retransmission timeout, defaults to 2.5 round trips
+        sender, receiver : already built endpoints, to drive custom state machines
+        seq_bits    : frames and acks cross the channel as seq_bits wide numbers, unbounded by default.
+                      The window is cut down to what the sequence space allows
+        jitter      : every one way delay is drawn from delay * [1 - jitter, 1 + jitter].
+                      Each direction stays first in first out, like a queue that fills and drains
+        adaptive    : start from `timeout`, then estimate it from the round trips (RFC 6298, Karn's rule)
+    """
+    if sender is None or receiver is None:
+        sender, receiver = make_endpoints(protocol, window_size, seq_bits)
+    if ack_loss is None:
+        ack_loss = loss
+    if loss >= 1 or ack_loss >= 1:
+        raise ValueError('nothing ever gets through with loss >= 1')
+    if not 0 <= jitter < 1:
+        raise ValueError('jitter must be within [0, 1), got %r' % jitter)
+    if timeout is None:
+        timeout = 5.0 * delay
+    rto = RtoEstimator(timeout, min_rto=delay, max_rto=64 * timeout) if adaptive else None
+
+    sim = Simulator()
+    schedule = sim.schedule
+    chance = random.Random(seed).random
+    result = Result(protocol, frames)
+    # transmissions of every frame, and the latest timer of each, so older timers are ignored
+    attempt = {}
+    armed = {}
+    # when each frame last went out, and which ones made it across at least once
+    sent_at = {}
+    received = set()
+
+    wrap = sender.space.wrap
+
+    # when the last frame / ack in flight arrives, nothing overtakes it
+    last = {'frames': 0.0, 'acks': 0.0}
+
+    def latency(direction):
+        if not jitter:
+            return delay
+        arrival = max(sim.now + delay * (1 + jitter * (2 * chance() - 1)), last[direction])
+        last[direction] = arrival
+        return arrival - sim.now
+
+    def arm(seq, wait):
+        armed[seq] = token = armed.get(seq, 0) + 1
+        schedule(wait, timer_fired, seq, token)
+
+    def transmit(batch):
+        wait = rto.timeout if rto is not None else timeout
+        for seq in batch:
+            attempt[seq] = attempt.get(seq, 0) + 1
+            sent_at[seq] = sim.now
+            arm(seq, wait)
+            if chance() >= loss:
+                schedule(latency('frames'), frame_arrived, wrap(seq))
+
+    def timer_fired(seq, token):
+        if armed.get(seq) == token and not sender.is_acked(seq):
+            resend = sender.on_timeout(seq)
+            # one backoff per loss, when the oldest frame goes again, not one per frame timer
+            if rto is not None and resend and resend[0] == sender.base:
+                rto.backoff()
+            transmit(resend)
+
+    def frame_arrived(number):
+        seq = receiver.unwrap(number)
+        if seq in received:
+            result.duplicates += 1
+        else:
+            received.add(seq)
+        accepted, ack = receiver.on_frame(seq)
+        if ack is not None:
+            result.acks += 1
+            if chance() >= ack_loss:
+                schedule(latency('acks'), ack_arrived, wrap(ack))
+
+    def ack_arrived(number):
+        ack = sender.unwrap(number)
+        # Karn : only a frame sent exactly once tells the round trip
+        if rto is not None and sender.in_flight(ack) and not sender.is_acked(ack):
+            backed_off = rto.backoffs
+            if attempt[ack] == 1:
+                rto.sample(sim.now - sent_at[ack])
+            else:
+                rto.restore()
+            if backed_off:
+                # the path is back, timers still running on the backed off timeout restart on the fresh one
+                for seq in range(sender.base, sender.next_seq):
+                    if seq != ack and not sender.is_acked(seq):
+                        arm(seq, rto.timeout)
+        transmit(sender.on_ack(ack))
+        if sender.done:
+            result.elapsed = sim.now
+
+    transmit(sender.load(frames))
+    sim.run()
+
+    result.delivered = receiver.delivered
+    result.transmissions = sender.transmissions
+    result.retransmissions = sender.retransmissions
+    return result
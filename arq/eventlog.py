@@ -0,0 +1,124 @@
+"""
+Structured event log for the socket handlers : one JSON line per event.
+
+    {"ts": 1529590000.12, "level": "DEBUG", "event": "ack_received",
+     "sid": "3f2a...", "namespace": "/go-back-N", "ack": 7}
+
+Off until configure() is called, and cheap while off : a disabled level or a
+sampled out namespace returns before any record is built. Records go through a
+QueueHandler, so handlers only enqueue, and a QueueListener does the writing.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+# above CRITICAL, nothing passes
+OFF = logging.CRITICAL + 10
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Task : record -> one JSON line, fields with no value are left out
+    """
+
+    def format(self, record):
+        line = {'ts': round(record.created, 6), 'level': record.levelname, 'event': record.getMessage()}
+        line.update(getattr(record, 'fields', {}))
+        return json.dumps(line, separators=(',', ':'), default=str)
+
+
+def parse_sample_rates(text):
+    """
+    Task : "/go-back-N=0.1,/selective-repeat=1,*=0.01" -> {namespace: rate}, '*' for everything else
+    """
+    rates = {}
+    for part in (text or '').split(','):
+        if not part.strip():
+            continue
+        namespace, _, rate = part.partition('=')
+        rate = float(rate)
+        if not 0 <= rate <= 1:
+            raise ValueError('sample rate of %s must be within [0, 1], got %r' % (namespace, rate))
+        rates[namespace.strip()] = rate
+    return rates
+
+
+class EventLog(object):
+    """
+    Objective : leveled, per namespace sampled, JSON line event log
+    Approach  : a plain logging.Logger underneath, so it also plays with any other handler.
+                Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, name='arq.events'):
+        self.logger = logging.getLogger(name)
+        self.logger.propagate = False
+        self.logger.setLevel(OFF)
+        self.rates = {}
+        self.listener = None
+        self._random = random.Random()
+
+    def configure(self, level='INFO', sample=None, stream=None):
+        """
+        Input Parameters:
+            level  : name or number, e.g. 'DEBUG'. None or 'OFF' switches the log off
+            sample : {namespace: rate} or "ns=rate,..." text, see parse_sample_rates
+            stream : where the lines go, default stdout
+        """
+        self.close()
+        if isinstance(sample, str):
+            sample = parse_sample_rates(sample)
+        self.rates = dict(sample or {})
+        if level is None or str(level).upper() == 'OFF':
+            self.logger.setLevel(OFF)
+            return self
+        self.logger.setLevel(level if isinstance(level, int) else str(level).upper())
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+        records = queue.Queue(-1)
+        self.logger.handlers = [logging.handlers.QueueHandler(records)]
+        self.listener = logging.handlers.QueueListener(records, output)
+        self.listener.start()
+        return self
+
+    def close(self):
+        """
+        Task : flush what is queued and stop the writer
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.logger.handlers = []
+
+    def enabled(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def sampled(self, level, namespace):
+        if level >= logging.WARNING:
+            return True
+        rate = self.rates.get(namespace, self.rates.get('*', 1.0))
+        return rate >= 1 or self._random.random() < rate
+
+    def log(self, level, event, **fields):
+        """
+        Task : one line, e.g. log(logging.DEBUG, 'ack_received', sid=sid, namespace=ns, ack=7)
+        """
+        if not self.logger.isEnabledFor(level) or not self.sampled(level, fields.get('namespace')):
+            return
+        fields = dict((key, value) for key, value in fields.items() if value is not None)
+        record = self.logger.makeRecord(self.logger.name, level, '', 0, event, None, None,
+                                        extra={'fields': fields})
+        self.logger.handle(record)
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
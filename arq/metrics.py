@@ -0,0 +1,173 @@
+"""
+Counters, gauges and histograms in the Prometheus text exposition format.
+
+No locks and no dependency : every metric child is a few plain numbers that
+handlers bump in place. Under gevent or eventlet handlers never preempt each
+other in the middle of an update. Under threading an update may, very rarely,
+be lost, which a metric can live with.
+
+    frames = registry.counter('arq_frames_sent_total', 'Frames handed to the sender', ('namespace',))
+    frames.labels('/go-back-N').inc()
+    registry.render()   # -> text for GET /metrics
+
+Every worker process keeps its own numbers.
+"""
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds, from a fast handler up to a slow retransmission
+DEFAULT_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return '+Inf' if value == float('inf') else repr(value)
+
+
+class _Value(object):
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _Buckets(object):
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric(object):
+    """
+    Objective : one metric family, children keyed by label values
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        """
+        Task : child for these label values, in labelnames order, created on first use
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError('%s takes labels %s, got %r' % (self.name, self.labelnames, values))
+            child = self._children[values] = self._child()
+        return child
+
+    def _child(self):
+        return _Value()
+
+    def samples(self):
+        for values, child in sorted(self._children.items()):
+            yield self.name + _labels(self.labelnames, values), child.value
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s %s' % (self.name, self.kind)]
+        lines.extend('%s %s' % (name, _number(value)) for name, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+
+class Gauge(Metric):
+    """
+    A gauge that is either set by hand, or read at scrape time from `collect`,
+    a callable returning {label values tuple: value}.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super(Gauge, self).__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self):
+        if self.collect is None:
+            for sample in super(Gauge, self).samples():
+                yield sample
+            return
+        for values, value in sorted(self.collect().items()):
+            yield self.name + _labels(self.labelnames, values), value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _Buckets(self.buckets)
+
+    def samples(self):
+        for values, child in sorted(self._children.items()):
+            running = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                running += count
+                yield self.name + '_bucket' + _labels(self.labelnames, values, 'le="%s"' % _number(float(bound))), running
+            yield self.name + '_sum' + _labels(self.labelnames, values), child.sum
+            yield self.name + '_count' + _labels(self.labelnames, values), child.count
+
+
+class Registry(object):
+    """
+    Objective : the metrics one /metrics endpoint shows
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        if any(existing.name == metric.name for existing in self._metrics):
+            raise ValueError('metric %s is already registered' % metric.name)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
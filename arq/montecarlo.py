@@ -0,0 +1,299 @@
+"""
+Vectorised Monte Carlo sweep of the three ARQ protocols, for sizing windows and timeouts.
+
+Every (protocol, window, loss, rtt, timeout, trial) combination is one lane,
+and all lanes of a protocol step through time together as numpy arrays.
+Time is slotted : one slot is the time to put one frame on the wire, so a
+sender transmits at most one frame per slot. `rtt` and `timeout` are in slots.
+The lanes follow the same rules as the state machines in protocols.py :
+    stop and wait    : selective repeat with a window of one
+    go back N        : cumulative acks, a timeout on base resends from base
+    selective repeat : per frame acks and timers, the oldest expired frame goes first
+
+    python -m arq.montecarlo --windows 1,4,16 --losses 0,0.05,0.2 --rtts 8,32
+"""
+import argparse
+import itertools
+import json
+import sys
+import warnings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PROTOCOL_NAMES = ('stop-and-wait', 'go-back-N', 'selective-repeat')
+
+
+def _run_lanes(go_back, window, loss, ack_loss, rtt, timeout, frames, rng, max_slots):
+    """
+    Objective : run every lane to completion, or to max_slots
+    To        : (transmissions, retransmissions, elapsed) per lane, elapsed is NaN if unfinished
+    """
+    total = len(window)
+    out_transmissions = np.zeros(total, np.int64)
+    out_retransmissions = np.zeros(total, np.int64)
+    out_elapsed = np.full(total, np.nan)
+
+    wmax = int(window.max())
+    ring = int(rtt.max()) + 1
+    # original lane number of every row, rows get dropped as lanes finish
+    ids = np.arange(total)
+    base = np.ones(total, np.int64)
+    next_seq = np.ones(total, np.int64)
+    cursor = np.ones(total, np.int64)
+    expected = np.ones(total, np.int64)
+    transmissions = np.zeros(total, np.int64)
+    retransmissions = np.zeros(total, np.int64)
+    sent_at = np.zeros((total, wmax), np.int64)
+    acked = np.zeros((total, wmax), bool)
+    # ack arriving at slot t sits at column t % ring, -1 for none
+    acks = np.full((total, ring), -1, np.int64)
+    columns = np.arange(wmax)
+
+    now = 0
+    while len(ids) and now < max_slots:
+        rows = np.arange(len(ids))
+
+        # ################ acks arriving in this slot ################
+        ack = acks[:, now % ring].copy()
+        acks[:, now % ring] = -1
+        if go_back:
+            moved = ack >= base
+            base[moved] = ack[moved] + 1
+            np.maximum(cursor, base, out=cursor)
+        else:
+            fresh = (ack >= base) & (ack < next_seq)
+            acked[rows[fresh], ack[fresh] % wmax] = True
+            while True:
+                slide = (base < next_seq) & acked[rows, base % wmax]
+                if not slide.any():
+                    break
+                acked[rows[slide], base[slide] % wmax] = False
+                base[slide] += 1
+
+        finished = base > frames
+        if finished.any():
+            out_transmissions[ids[finished]] = transmissions[finished]
+            out_retransmissions[ids[finished]] = retransmissions[finished]
+            out_elapsed[ids[finished]] = now
+            keep = ~finished
+            ids, base, next_seq, cursor, expected = ids[keep], base[keep], next_seq[keep], cursor[keep], expected[keep]
+            transmissions, retransmissions = transmissions[keep], retransmissions[keep]
+            sent_at, acked, acks = sent_at[keep], acked[keep], acks[keep]
+            window, loss, ack_loss, rtt, timeout = window[keep], loss[keep], ack_loss[keep], rtt[keep], timeout[keep]
+            rows = np.arange(len(ids))
+            if not len(ids):
+                break
+
+        # ################ pick one frame per lane to put on the wire ################
+        if go_back:
+            expired = (base < next_seq) & (cursor > base) & (sent_at[rows, base % wmax] + timeout <= now)
+            cursor[expired] = base[expired]
+            send = (cursor < base + window) & (cursor <= frames)
+            seq = cursor.copy()
+            cursor[send] += 1
+            repeat = send & (seq < next_seq)
+            np.maximum(next_seq, cursor, out=next_seq)
+        else:
+            held = base[:, None] + (columns[None, :] - base[:, None]) % wmax
+            due = (held < next_seq[:, None]) & ~acked & (sent_at + timeout[:, None] <= now)
+            repeat = due.any(1)
+            seq = np.where(repeat, np.where(due, held, np.iinfo(np.int64).max).min(1), next_seq)
+            fresh = ~repeat & (next_seq < base + window) & (next_seq <= frames)
+            send = repeat | fresh
+            next_seq[fresh] += 1
+
+        sender = rows[send]
+        seq = seq[send]
+        sent_at[sender, seq % wmax] = now
+        transmissions[sender] += 1
+        retransmissions[sender] += repeat[send]
+
+        # ################ channel and receiver ################
+        arrived = rng.random_sample(len(sender)) >= loss[send]
+        returned = arrived & (rng.random_sample(len(sender)) >= ack_loss[send])
+        if go_back:
+            in_order = arrived & (seq == expected[sender])
+            expected[sender[in_order]] += 1
+            ack = expected[sender] - 1
+            returned &= ack >= 1
+        else:
+            ack = seq
+        lanes = sender[returned]
+        acks[lanes, (now + rtt[lanes]) % ring] = ack[returned]
+
+        now += 1
+
+    return out_transmissions, out_retransmissions, out_elapsed
+
+
+def _check(protocols, window_sizes, losses, rtts, timeouts, frames, trials, ack_loss, max_slots):
+    """
+    Task : ValueError on any parameter the lanes cannot run with
+    """
+    for protocol in protocols:
+        if protocol not in PROTOCOL_NAMES:
+            raise ValueError('unknown protocol %r, choose from %s' % (protocol, ', '.join(PROTOCOL_NAMES)))
+    for name, values, low in (('window size', window_sizes, 1), ('rtt', rtts, 1),
+                              ('timeout', [t for t in timeouts if t is not None], 1),
+                              ('frames', (frames,), 1), ('trials', (trials,), 1),
+                              ('max_slots', () if max_slots is None else (max_slots,), 1)):
+        for value in values:
+            if value < low:
+                raise ValueError('%s must be at least %d, got %r' % (name, low, value))
+    for value in tuple(losses) + (() if ack_loss is None else (ack_loss,)):
+        if not 0 <= value < 1:
+            raise ValueError('loss must be in [0, 1), got %r' % value)
+
+
+def default_max_slots(frames, rtts):
+    """
+    To : slots a run gets before it counts as unfinished, ten times what stop and wait
+         needs without loss. Room for losses up to about a half at a timeout of 2 * rtt
+    """
+    return 10 * frames * (max(rtts, default=0) + 1)
+
+
+def sweep_cost(protocols=PROTOCOL_NAMES, window_sizes=(1, 2, 4, 8, 16), losses=(0.0, 0.01, 0.05, 0.1, 0.2),
+               rtts=(4, 16), timeouts=(None,), frames=200, trials=10, ack_loss=None, max_slots=None):
+    """
+    Objective : bound the work of a sweep before running it, for callers that take the grid from users
+    Approach  : every lane may run max_slots slots. A go back N lane does a few cells of work per slot,
+                a selective repeat lane also scans the whole window. Plus the arrays each lane holds
+    To        : cost in array cells, about 20 ns each. Same ValueErrors as sweep
+    """
+    _check(protocols, window_sizes, losses, rtts, timeouts, frames, trials, ack_loss, max_slots)
+    if max_slots is None:
+        max_slots = default_max_slots(frames, rtts)
+    ring = max(rtts, default=0) + 1
+    cost = 0
+    for protocol in protocols:
+        windows = (1,) if protocol == 'stop-and-wait' else window_sizes
+        lanes = len(windows) * len(losses) * len(rtts) * len(timeouts) * trials
+        if not lanes:
+            continue
+        wmax = min(max(windows), frames)
+        scan = 0 if protocol == 'go-back-N' else wmax
+        cost += lanes * (max_slots * (4 + scan) + ring + 2 * wmax)
+    return cost
+
+
+def sweep(protocols=PROTOCOL_NAMES, window_sizes=(1, 2, 4, 8, 16), losses=(0.0, 0.01, 0.05, 0.1, 0.2),
+          rtts=(4, 16), timeouts=(None,), frames=200, trials=10, ack_loss=None, seed=None,
+          max_slots=None):
+    """
+    Objective : run the full grid of parameters, `trials` runs each
+    Input Parameters:
+        timeouts  : in slots, None means 2 * rtt
+        ack_loss  : probability an ack is lost, None means same as the frame loss
+        max_slots : give up on a run after this many slots, counted as unfinished. None means default_max_slots()
+    To        : one dict per combination with mean throughput (frames sent per slot),
+                goodput (frames delivered per slot), retransmissions and elapsed slots.
+                ValueError for windows, rtts, timeouts, frames or trials under 1, or a loss outside [0, 1)
+    """
+    if np is None:
+        raise RuntimeError('the Monte Carlo sweep needs numpy, run `pip install numpy`')
+    _check(protocols, window_sizes, losses, rtts, timeouts, frames, trials, ack_loss, max_slots)
+    rng = np.random.RandomState(seed)
+    if max_slots is None:
+        max_slots = default_max_slots(frames, rtts)
+    rows = []
+    for protocol in protocols:
+        windows = (1,) if protocol == 'stop-and-wait' else window_sizes
+        grid = []
+        for window, loss, rtt, timeout in itertools.product(windows, losses, rtts, timeouts):
+            timeout = 2 * rtt if timeout is None else timeout
+            grid.append((window, loss, loss if ack_loss is None else ack_loss, rtt, timeout))
+        if not grid:
+            continue
+        params = np.repeat(np.array(grid, dtype=float), trials, axis=0)
+        # never more than `frames` outstanding, a bigger window only costs memory
+        transmissions, retransmissions, elapsed = _run_lanes(
+            protocol == 'go-back-N',
+            np.minimum(params[:, 0], frames).astype(np.int64), params[:, 1], params[:, 2],
+            params[:, 3].astype(np.int64), params[:, 4].astype(np.int64),
+            frames, rng, max_slots)
+
+        transmissions = transmissions.reshape(len(grid), trials)
+        retransmissions = retransmissions.reshape(len(grid), trials)
+        elapsed = elapsed.reshape(len(grid), trials)
+        done = ~np.isnan(elapsed)
+        # a cell where no run finished averages to NaN, reported as None. nanmean warns about
+        # those through warnings, which np.errstate does not cover
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            safe = np.where(done, np.maximum(elapsed, 1), np.nan)
+            throughput = np.nanmean(transmissions / safe, axis=1)
+            goodput = np.nanmean(frames / safe, axis=1)
+            mean_elapsed = np.nanmean(safe, axis=1)
+        for i, (window, loss, lost_acks, rtt, timeout) in enumerate(grid):
+            rows.append({
+                'protocol': protocol,
+                'window_size': window,
+                'loss': loss,
+                'ack_loss': lost_acks,
+                'rtt': rtt,
+                'timeout': timeout,
+                'frames': frames,
+                'trials': trials,
+                'finished': int(done[i].sum()),
+                'throughput': _number(throughput[i]),
+                'goodput': _number(goodput[i]),
+                'efficiency': _number(goodput[i] / throughput[i]) if throughput[i] else None,
+                'transmissions': float(transmissions[i].mean()),
+                'retransmissions': float(retransmissions[i].mean()),
+                'elapsed': _number(mean_elapsed[i]),
+            })
+    return rows
+
+
+def _number(value):
+    """ numpy scalar -> float, NaN -> None so the result stays valid JSON """
+    value = float(value)
+    return None if value != value else value
+
+
+# ################################## CLI #####################################
+
+def _numbers(kind):
+    def parse(text):
+        return tuple(kind(part) for part in text.split(',') if part)
+    return parse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--protocols', type=lambda text: tuple(text.split(',')), default=PROTOCOL_NAMES)
+    parser.add_argument('--windows', type=_numbers(int), default=(1, 2, 4, 8, 16))
+    parser.add_argument('--losses', type=_numbers(float), default=(0.0, 0.01, 0.05, 0.1, 0.2))
+    parser.add_argument('--ack-loss', type=float, default=None)
+    parser.add_argument('--rtts', type=_numbers(int), default=(4, 16), help='round trip time, in slots')
+    parser.add_argument('--timeouts', type=_numbers(int), default=(None,), help='in slots, default 2 * rtt')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--trials', type=int, default=10)
+    parser.add_argument('--max-slots', type=int, default=None, help='give up on a run after this many slots')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    try:
+        rows = sweep(args.protocols, args.windows, args.losses, args.rtts, args.timeouts,
+                     args.frames, args.trials, args.ack_loss, args.seed, args.max_slots)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.json:
+        json.dump(rows, sys.stdout, indent=1)
+        print()
+        return
+    columns = ('protocol', 'window_size', 'loss', 'rtt', 'timeout', 'throughput', 'goodput',
+               'retransmissions', 'elapsed')
+    print(' '.join('%16s' % column for column in columns))
+    for row in rows:
+        print(' '.join('%16s' % (('%.4g' % row[column]) if isinstance(row[column], float) else row[column])
+                       for column in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Real payloads : a byte stream cut into frames and put back together.
+
+The sender side slices frames out of one memoryview, so a frame is a window
+onto the payload and nothing is copied until it goes onto the socket. The
+receiver side writes every frame it takes in straight to its offset in a
+preallocated bytearray, which doubles as the reorder buffer :
+
+    outgoing = Segmenter(data, mtu=1024)
+    outgoing.segment(3)              # -> memoryview of bytes 2048 .. 3071
+    incoming = Reassembler(len(data), mtu=1024)
+    incoming.put(3, frame)           # any order, duplicates are ignored
+    incoming.done, incoming.checksum()
+
+Frames are numbered from 1 like everywhere else, frame n holds the bytes
+[(n - 1) * mtu, n * mtu).
+"""
+import hashlib
+import os
+import random
+from timeit import default_timer
+
+
+def checksum(data):
+    """
+    To : hex SHA-256 of a payload, the same on both sides when the transfer went right
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def generate(size, seed=None):
+    """
+    Task : `size` bytes to send when there is no file, reproducible with a seed
+    """
+    if seed is None:
+        return os.urandom(size)
+    return random.Random(seed).getrandbits(8 * size).to_bytes(size, 'big') if size else b''
+
+
+def frame_count(size, mtu):
+    return -(-size // mtu)
+
+
+class Segmenter(object):
+    """
+    Objective : the sender's view of a payload, one memoryview slice per frame
+    """
+    __slots__ = ('view', 'mtu', 'frames')
+
+    def __init__(self, data, mtu):
+        if mtu < 1:
+            raise ValueError('mtu must be at least 1 byte, got %r' % mtu)
+        self.view = memoryview(data).cast('B')
+        self.mtu = mtu
+        self.frames = frame_count(len(self.view), mtu)
+
+    @property
+    def size(self):
+        return len(self.view)
+
+    def segment(self, seq):
+        """
+        To : the bytes of frame `seq`, a slice of the payload, not a copy
+        """
+        if not 1 <= seq <= self.frames:
+            raise IndexError('frame %d is not in 1 .. %d' % (seq, self.frames))
+        start = (seq - 1) * self.mtu
+        return self.view[start:start + self.mtu]
+
+    def checksum(self):
+        return checksum(self.view)
+
+    def __repr__(self):
+        return '<Segmenter %d bytes in %d frames of %d>' % (self.size, self.frames, self.mtu)
+
+
+class Reassembler(object):
+    """
+    Objective : the receiver's copy of a payload, filled in frame by frame
+    Approach  : one bytearray of the final size, and one flag byte per frame
+                so a duplicate is not counted twice
+    """
+    __slots__ = ('buffer', 'mtu', 'frames', 'filled', 'remaining', 'received', 'started')
+
+    def __init__(self, size, mtu, clock=default_timer):
+        if mtu < 1:
+            raise ValueError('mtu must be at least 1 byte, got %r' % mtu)
+        self.buffer = bytearray(size)
+        self.mtu = mtu
+        self.frames = frame_count(size, mtu)
+        self.filled = bytearray(self.frames)
+        self.remaining = self.frames
+        # payload bytes written so far, and since when, for the goodput
+        self.received = 0
+        self.started = clock()
+
+    @property
+    def size(self):
+        return len(self.buffer)
+
+    @property
+    def done(self):
+        return not self.remaining
+
+    def put(self, seq, data):
+        """
+        Task : write frame `seq` at its offset
+        To   : True if the frame was new
+        """
+        if not 1 <= seq <= self.frames:
+            raise IndexError('frame %d is not in 1 .. %d' % (seq, self.frames))
+        if self.filled[seq - 1]:
+            return False
+        start = (seq - 1) * self.mtu
+        length = min(self.mtu, len(self.buffer) - start)
+        if len(data) != length:
+            raise ValueError('frame %d carries %d bytes, expected %d' % (seq, len(data), length))
+        self.buffer[start:start + length] = data
+        self.filled[seq - 1] = 1
+        self.remaining -= 1
+        self.received += length
+        return True
+
+    def checksum(self):
+        return checksum(self.buffer)
+
+    def __repr__(self):
+        return '<Reassembler %d of %d frames>' % (self.frames - self.remaining, self.frames)
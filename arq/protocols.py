@@ -0,0 +1,392 @@
+"""
+Sender and receiver state machines for the three ARQ protocols.
+
+Frames are numbered from 1, the same way the frontend numbers its packets,
+and an ack carries the number of the frame it acknowledges.
+Internally the numbers only ever grow. With seq_bits=k the sender and the
+receiver expect k-bit numbers on the wire : space.wrap() what goes out and
+unwrap() what comes in, see seqspace.py.
+None of these classes know about sockets or clocks. The socket handlers in
+app.py and the simulator in engine.py both drive them the same way :
+
+    frames = sender.load(n)           # transmit these
+    frames = sender.on_ack(ack)       # transmit these
+    frames = sender.on_timeout(seq)   # retransmit these
+    accepted, ack = receiver.on_frame(seq, data)   # receiver.run : what a buffering receiver released
+
+Selective repeat acks may also carry SACK blocks, (first, last) ranges of
+everything the receiver holds :
+
+    blocks = receiver.sack()                      # [(1, 6), (9, 11)] : 7 and 8 are missing
+    acked, frames, holes = sender.on_sack(blocks) # transmit frames, retransmit holes
+"""
+from .acks import AckWindow, UnackedFrames
+from .seqspace import SequenceSpace
+
+# SACK blocks one ack carries at most, as many as fit in a TCP header
+SACK_BLOCKS = 4
+
+
+# ################################## Senders #####################################
+
+class Sender(object):
+    """
+    Objective : Sliding window sender, shared by all three protocols.
+    Approach  : frames in [base, next_seq) are on the wire. Subclasses decide
+                what an ack means and what to resend on a timeout.
+                Acks are kept in an AckWindow, base is its lowest unacked frame.
+    """
+    # largest window the protocol allows, None for no limit
+    max_window = None
+    # acks cover every frame below them, which allows a larger window in a k-bit space
+    cumulative = False
+    # what keeps track of the acks, see acks.py
+    window_class = AckWindow
+
+    def __init__(self, window_size=1, seq_bits=None):
+        self.space = SequenceSpace(seq_bits)
+        self.acks = self.window_class(window_size)
+        self.window_size = window_size
+        self.next_seq = 1
+        self.total = 0
+        self.transmissions = 0
+        self.retransmissions = 0
+
+    @property
+    def window_size(self):
+        return self._window_size
+
+    @window_size.setter
+    def window_size(self, value):
+        for limit in (self.max_window, self.space.window_limit(self.cumulative)):
+            if limit is not None:
+                value = min(value, limit)
+        self._window_size = value
+        if value > self.acks.capacity:
+            self.acks.resize(value)
+
+    @property
+    def base(self):
+        return self.acks.base
+
+    @property
+    def done(self):
+        return self.acks.base > self.total
+
+    def in_flight(self, seq):
+        return self.acks.base <= seq < self.next_seq
+
+    def is_acked(self, seq):
+        return seq in self.acks
+
+    def unwrap(self, seq):
+        """
+        Task : k-bit number of an ack, nak or timer off the wire -> frame number.
+               Anything worth acting on was sent already, so it lies below next_seq
+        """
+        return self.space.unwrap_below(seq, self.next_seq)
+
+    def load(self, count):
+        """
+        Task : hand `count` more frames to the sender
+        To   : frames that fit into the window right now
+        """
+        self.total += count
+        return self._fill()
+
+    def _fill(self):
+        limit = min(self.base + self.window_size, self.total + 1)
+        if limit <= self.next_seq:
+            return []
+        frames = range(self.next_seq, limit)
+        self.next_seq = limit
+        self.transmissions += len(frames)
+        return frames
+
+    def _resend(self, frames):
+        self.transmissions += len(frames)
+        self.retransmissions += len(frames)
+        return frames
+
+    def keep(self, seq, data):
+        """
+        Task : remember what frame `seq` carried when it went out, for senders that buffer frames
+        """
+
+    def frame(self, seq):
+        """
+        To : what frame `seq` carried, None if the sender does not know
+        """
+        return None
+
+    def on_ack(self, ack):
+        raise NotImplementedError
+
+    def on_timeout(self, seq):
+        raise NotImplementedError
+
+    def on_nak(self, seq):
+        return self.on_timeout(seq)
+
+    def on_sack(self, ranges):
+        """
+        Task : an ack for every frame of the (first, last) ranges
+        To   : (frames newly acked, frames to transmit, frames to retransmit)
+        """
+        acked, frames = [], []
+        for first, last in ranges:
+            for seq in range(max(first, self.base), min(last, self.next_seq - 1) + 1):
+                if not self.is_acked(seq):
+                    acked.append(seq)
+                    frames.extend(self.on_ack(seq))
+        return acked, frames, []
+
+
+class SelectiveRepeatSender(Sender):
+    """
+    Every frame is acked on its own, and only the frame that timed out is resent.
+    SACK blocks ack a whole set at once, and a frame with `dup_threshold` acked
+    frames above it is taken for lost and resent right away, once.
+    """
+    # acked frames above a hole that make it a loss, like TCP's DupThresh
+    dup_threshold = 3
+
+    def __init__(self, window_size=1, seq_bits=None):
+        super(SelectiveRepeatSender, self).__init__(window_size, seq_bits)
+        # holes already resent on SACK information, the timer takes over if they go missing again
+        self.fast_resent = set()
+
+    def on_ack(self, ack):
+        if not self.in_flight(ack):
+            return []
+        self.acks.add(ack)
+        return self._fill()
+
+    def on_sack(self, ranges):
+        # one pass over the blocks sets the ack bits, the window slides once after it
+        last = self.next_seq - 1
+        acked = self.acks.add_ranges([(first, min(end, last)) for first, end in ranges if first <= last])
+        return acked, self._fill(), self._holes()
+
+    def _holes(self):
+        """
+        To : unacked frames below at least dup_threshold acked ones, not resent that way yet
+        """
+        base = self.base
+        self.fast_resent = set(seq for seq in self.fast_resent if seq >= base)
+        holes = []
+        above = 0
+        for seq in range(min(self.acks.highest, self.next_seq - 1), base - 1, -1):
+            if seq in self.acks:
+                above += 1
+            elif above >= self.dup_threshold and seq not in self.fast_resent:
+                holes.append(seq)
+        if not holes:
+            return []
+        holes.reverse()
+        self.fast_resent.update(holes)
+        return self._resend(holes)
+
+    def on_timeout(self, seq):
+        if not self.in_flight(seq) or seq in self.acks:
+            return []
+        return self._resend(range(seq, seq + 1))
+
+
+class StopAndWaitSender(SelectiveRepeatSender):
+    """
+    Selective repeat with a window of exactly one frame.
+    """
+    max_window = 1
+
+
+class GoBackNSender(Sender):
+    """
+    Acks are cumulative, and a timeout on the oldest frame resends the whole window.
+    The unacked frames [base, next_seq) sit in a ring, so an ack slides the window
+    in O(1) however many frames it covers, and the window refills right away.
+    """
+    cumulative = True
+    window_class = UnackedFrames
+
+    def keep(self, seq, data):
+        if self.in_flight(seq):
+            self.acks.put(seq, data)
+
+    def frame(self, seq):
+        return self.acks.data(seq)
+
+    def on_ack(self, ack):
+        if not self.in_flight(ack):
+            return []
+        self.acks.advance_to(ack)
+        return self._fill()
+
+    def on_timeout(self, seq):
+        # any frame overdue means the oldest one is too, the whole window goes back.
+        # a resend re-arms every timer of the window, so the others do not go off again
+        if not self.in_flight(seq):
+            return []
+        return self._resend(range(self.base, self.next_seq))
+
+    def on_nak(self, seq):
+        # the receiver only takes frames in order, so go back to base, not just to seq
+        if not self.in_flight(seq):
+            return []
+        return self._resend(range(self.base, self.next_seq))
+
+
+# ################################## Receivers #####################################
+
+class Receiver(object):
+    """
+    Objective : Receiver side. on_frame() returns (accepted, ack)
+                accepted : frame is new and was taken in
+                ack      : frame number to acknowledge, None to stay quiet
+                In order receivers hand each accepted frame straight to the upper layer.
+                Those that buffer put the frames released by the latest on_frame() in
+                `run`, as (seq, data) in order.
+    """
+    run = ()
+
+    def __init__(self, window_size=1, seq_bits=None):
+        self.space = SequenceSpace(seq_bits)
+        self.window_size = window_size
+        self.expected = 1
+        self.delivered = 0
+
+    def unwrap(self, seq):
+        """
+        Task : k-bit number of a frame off the wire -> frame number.
+               Only `expected` is ever taken in, so everything else is placed below it
+        """
+        return self.space.unwrap_below(seq, self.expected + 1)
+
+    def on_frame(self, seq, data=None):
+        raise NotImplementedError
+
+
+class StopAndWaitReceiver(Receiver):
+
+    def on_frame(self, seq, data=None):
+        if seq == self.expected:
+            self.expected += 1
+            self.delivered += 1
+            return True, seq
+        # duplicate, our ack got lost on the way back. ack it again
+        if seq < self.expected:
+            return False, seq
+        return False, None
+
+
+class GoBackNReceiver(Receiver):
+
+    def on_frame(self, seq, data=None):
+        if seq == self.expected:
+            self.expected += 1
+            self.delivered += 1
+            return True, seq
+        # out of order or a duplicate, repeat the cumulative ack so the sender
+        # hears about it even when the ack of the last in order frame was lost
+        return False, (self.expected - 1) or None
+
+
+class SelectiveRepeatReceiver(Receiver):
+    """
+    Frames in [expected, expected + window_size) are taken in any order and acked one by one.
+    They wait in a reorder buffer of window_size slots, frame seq in slot (seq % window_size),
+    and every contiguous run starting at `expected` goes to the upper layer in one batch.
+    """
+
+    def __init__(self, window_size=1, seq_bits=None):
+        self.slots = []
+        super(SelectiveRepeatReceiver, self).__init__(window_size, seq_bits)
+
+    @property
+    def window_size(self):
+        return len(self.slots)
+
+    @window_size.setter
+    def window_size(self, value):
+        # frames already buffered keep their place, those beyond a smaller window get resent
+        limit = self.space.window_limit(False)
+        value = max(min(value, limit) if limit is not None else value, 1)
+        buffered = [entry for entry in self.slots if entry is not None and entry[0] < self.expected + value]
+        self.slots = [None] * value
+        for entry in buffered:
+            self.slots[entry[0] % value] = entry
+
+    def unwrap(self, seq):
+        # frames of the window ahead, or re-sent ones of the window behind, 2 windows fit the space
+        return self.space.unwrap_below(seq, self.expected + len(self.slots))
+
+    @property
+    def buffered(self):
+        """ frames waiting for a hole before them to fill """
+        return sorted(entry[0] for entry in self.slots if entry is not None)
+
+    def sack(self, limit=SACK_BLOCKS):
+        """
+        Task : SACK blocks, everything this receiver holds that the sender may still wait on
+        To   : up to `limit` sorted (first, last) ranges. The first one is the last window
+               delivered, below that the sender cannot be waiting. The rest are buffered runs,
+               the lowest first, nearest to the holes that hold everything up
+        """
+        blocks = []
+        if self.expected > 1:
+            blocks.append([max(1, self.expected - len(self.slots)), self.expected - 1])
+        for seq in self.buffered:
+            if blocks and seq == blocks[-1][1] + 1:
+                blocks[-1][1] = seq
+            elif len(blocks) == limit:
+                break
+            else:
+                blocks.append([seq, seq])
+        return [tuple(block) for block in blocks]
+
+    def on_frame(self, seq, data=None):
+        self.run = ()
+        slots = self.slots
+        window = len(slots)
+        expected = self.expected
+        if expected <= seq < expected + window:
+            slot = seq % window
+            if slots[slot] is not None:
+                return False, seq
+            slots[slot] = (seq, data)
+            if seq == expected:
+                run = self.run = []
+                slot = expected % window
+                while slots[slot] is not None:
+                    run.append(slots[slot])
+                    slots[slot] = None
+                    expected += 1
+                    slot = expected % window
+                self.expected = expected
+                self.delivered += len(run)
+            return True, seq
+        # already delivered, the sender missed our ack
+        if expected - window <= seq < expected:
+            return False, seq
+        return False, None
+
+
+# ################################## Registry #####################################
+
+PROTOCOLS = {
+    'stop-and-wait': (StopAndWaitSender, StopAndWaitReceiver),
+    'go-back-N': (GoBackNSender, GoBackNReceiver),
+    'selective-repeat': (SelectiveRepeatSender, SelectiveRepeatReceiver),
+}
+
+
+def make_endpoints(protocol, window_size=1, seq_bits=None):
+    """
+    Task : build a fresh (sender, receiver) pair for the named protocol,
+           numbered in a seq_bits wide sequence space, unbounded by default
+    """
+    try:
+        sender_class, receiver_class = PROTOCOLS[protocol]
+    except KeyError:
+        raise ValueError('unknown protocol %r, choose from %s' % (protocol, ', '.join(sorted(PROTOCOLS))))
+    return sender_class(window_size, seq_bits), receiver_class(window_size, seq_bits)
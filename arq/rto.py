@@ -0,0 +1,88 @@
+"""
+Adaptive retransmission timeout, the way TCP does it (RFC 6298).
+
+    SRTT   <- 7/8 SRTT + 1/8 R
+    RTTVAR <- 3/4 RTTVAR + 1/4 |SRTT - R|
+    RTO    <- SRTT + max(G, 4 RTTVAR), clamped to [min_rto, max_rto]
+
+Karn's rule : a frame that was sent more than once gives no sample, there is
+no telling which copy the ack is for. Every timeout doubles the RTO, and the
+ack of any new frame, resent or not, takes it back to the estimate. A lossy
+link resends most frames, waiting for a clean sample would keep it backed off.
+
+    rto = RtoEstimator(initial=2.0)
+    rto.sample(0.31)     # ack of a frame sent once, 0.31 s ago
+    rto.backoff()        # a timer went off
+    rto.restore()        # ack of a resent frame, the path works again
+    rto.timeout          # -> seconds to arm the next timer with
+"""
+
+
+class RtoEstimator(object):
+    """
+    Objective : retransmission timeout of one connection
+    Input Parameters:
+        initial     : RTO until the first sample
+        min_rto     : floor, keeps a burst of quick acks from making the timer hair trigger
+        max_rto     : ceiling for the backoff
+        granularity : clock granularity G, the smallest variance term
+    """
+    __slots__ = ('initial', 'srtt', 'rttvar', 'rto', 'min_rto', 'max_rto', 'granularity', 'backoffs')
+
+    def __init__(self, initial=1.0, min_rto=.2, max_rto=60.0, granularity=.001):
+        if not 0 < min_rto <= max_rto:
+            raise ValueError('need 0 < min_rto <= max_rto, got %r and %r' % (min_rto, max_rto))
+        self.initial = initial
+        self.srtt = None
+        self.rttvar = None
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.granularity = granularity
+        self.rto = self._clamp(initial)
+        # timeouts since the last clean sample
+        self.backoffs = 0
+
+    def _clamp(self, rto):
+        return min(max(rto, self.min_rto), self.max_rto)
+
+    def _estimate(self):
+        if self.srtt is None:
+            return self._clamp(self.initial)
+        return self._clamp(self.srtt + max(self.granularity, 4 * self.rttvar))
+
+    @property
+    def timeout(self):
+        return self.rto
+
+    def sample(self, rtt):
+        """
+        Task : fold in the round trip of a frame that was sent exactly once
+        """
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2.0
+        else:
+            self.rttvar += (abs(self.srtt - rtt) - self.rttvar) / 4.0
+            self.srtt += (rtt - self.srtt) / 8.0
+        self.rto = self._estimate()
+        self.backoffs = 0
+
+    def backoff(self):
+        """
+        Task : a retransmission timer went off, wait twice as long next time
+        """
+        self.rto = self._clamp(self.rto * 2)
+        self.backoffs += 1
+
+    def restore(self):
+        """
+        Task : a resent frame got acked, no sample but the path works. Drop the backoff
+        """
+        if self.backoffs:
+            self.rto = self._estimate()
+            self.backoffs = 0
+
+    def __repr__(self):
+        if self.srtt is None:
+            return '<RtoEstimator rto=%.3f>' % self.rto
+        return '<RtoEstimator srtt=%.3f rttvar=%.3f rto=%.3f>' % (self.srtt, self.rttvar, self.rto)
@@ -0,0 +1,90 @@
+"""
+Delayed emits for the middle layer, without parking a worker in time.sleep().
+
+One background task per process owns a heap of due callbacks, so a thousand
+packets waiting on the channel cost a thousand heap entries, not a thousand
+sleeping handlers.
+"""
+import heapq
+import itertools
+import traceback
+from functools import partial
+from threading import Lock
+from timeit import default_timer as clock
+
+
+class DelayScheduler(object):
+    """
+    Objective : run callbacks `delay` seconds from now, off the calling handler
+    Approach  : the first call_later() starts a background task through
+                socketio.start_background_task(). It wakes up every `tick` seconds
+                (or sooner), fires whatever is due, and exits once the heap is empty.
+    Usage     : scheduler.emit_later(.05, 'event', data, room=sid, namespace='/go-back-N')
+    """
+
+    def __init__(self, socketio, delay=.05, tick=.01):
+        self.socketio = socketio
+        self.delay = delay
+        self.tick = tick
+        self._queue = []
+        self._order = itertools.count()
+        self._lock = Lock()
+        self._running = False
+
+    def __len__(self):
+        return len(self._queue)
+
+    def call_later(self, delay, callback, *args, **kwargs):
+        if kwargs:
+            callback = partial(callback, **kwargs)
+        with self._lock:
+            heapq.heappush(self._queue, (clock() + delay, next(self._order), callback, args))
+            start, self._running = not self._running, True
+        if start:
+            self.socketio.start_background_task(self._run)
+
+    def emit_later(self, delay, event, data, room, namespace):
+        self.call_later(delay, self.socketio.emit, event, data, room=room, namespace=namespace)
+
+    def drive(self, wheel):
+        """
+        Task : advance a TimerWheel when its next timer is due, for as long as it has timers armed.
+               Call it again after arming a timer, the wheel wakes up earlier if that one is sooner.
+               An idle stretch costs one heap entry, not a callback every tick
+        """
+        due = wheel.next_due()
+        if due is None:
+            return
+        wake = wheel.epoch + due * wheel.tick
+        if wheel.wake is None or wake < wheel.wake:
+            wheel.wake = wake
+            self.call_later(max(wake - wheel.clock(), 0), self._drive, wheel, wake)
+
+    def _drive(self, wheel, wake):
+        if wheel.wake != wake:
+            # an earlier wake up took over from this one
+            return
+        wheel.wake = None
+        try:
+            wheel.advance()
+        finally:
+            self.drive(wheel)
+
+    def _run(self):
+        queue = self._queue
+        while True:
+            with self._lock:
+                now = clock()
+                due = []
+                while queue and queue[0][0] <= now:
+                    due.append(heapq.heappop(queue))
+                if not due and not queue:
+                    self._running = False
+                    return
+                wait = min(queue[0][0] - now, self.tick) if queue else 0
+            for _, _, callback, args in due:
+                try:
+                    callback(*args)
+                except Exception:
+                    traceback.print_exc()
+            self.socketio.sleep(wait)
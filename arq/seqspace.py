@@ -0,0 +1,56 @@
+"""
+k-bit sequence numbers for the wire.
+
+The state machines count frames with plain ints that only ever grow, which
+keeps every comparison in them trivially correct. What goes on the wire is
+that count modulo 2^k, so headers stay the same size however long the
+transfer. Whoever reads a number back off the wire unwraps it against a
+reference it knows the true number sits just below :
+
+    space = SequenceSpace(3)              # 0 .. 7 on the wire
+    space.wrap(13)                        # -> 5
+    space.unwrap_below(5, 15)             # -> 13, the largest n < 15 with n % 8 == 5
+
+That is unambiguous as long as the window is at most 2^k - 1 frames for go
+back N and 2^(k-1) for selective repeat, which the senders and receivers
+enforce. bits=None keeps the numbers unbounded.
+"""
+
+
+class SequenceSpace(object):
+    """
+    Objective : wrap and unwrap sequence numbers of a k-bit space
+    """
+    __slots__ = ('bits', 'modulus')
+
+    def __init__(self, bits=None):
+        if bits is not None and bits < 1:
+            raise ValueError('a sequence space needs at least 1 bit, got %r' % bits)
+        self.bits = bits
+        self.modulus = 1 << bits if bits is not None else None
+
+    def wrap(self, n):
+        """
+        Task : frame count -> number on the wire
+        """
+        return n if self.modulus is None else n & (self.modulus - 1)
+
+    def unwrap_below(self, seq, limit):
+        """
+        Task : number on the wire -> the largest frame count below `limit` it can stand for
+        """
+        if self.modulus is None:
+            return seq
+        return limit - 1 - ((limit - 1 - seq) & (self.modulus - 1))
+
+    def window_limit(self, cumulative):
+        """
+        To : largest usable window, 2^k - 1 with cumulative acks (go back N),
+             2^(k-1) with selective ones, None when unbounded
+        """
+        if self.modulus is None:
+            return None
+        return self.modulus - 1 if cumulative else self.modulus >> 1
+
+    def __repr__(self):
+        return '<SequenceSpace %s>' % ('unbounded' if self.bits is None else '%d bit' % self.bits)
@@ -0,0 +1,158 @@
+"""
+Per connection protocol state, kept in process memory keyed by socket id.
+
+Flask's session is copied, pickled and signed around every handler, and it
+only ever grows. The handlers keep their sender, receiver and timers here
+instead, and the disconnect handlers drop them again.
+
+With a shared store (see store.py) the sender and receiver are also written
+through to it, so any worker can pick up the next event of a connection.
+Timers always stay with the worker that armed them.
+"""
+import pickle
+
+from .channel import ChannelModel
+from .protocols import make_endpoints
+from .rto import RtoEstimator
+from .timers import TimerWheel
+
+
+class ArqSession(object):
+    """
+    Everything one connection needs to run its protocol.
+    """
+    __slots__ = ('sid', 'namespace', 'protocol', 'wire', 'sender', 'receiver', 'channel', 'rto', 'duplex', 'owed',
+                 'timers', 'sent_at', 'outgoing', 'incoming')
+
+    def __init__(self, sid, namespace, protocol, window_size=1, channel=None, seq_bits=None, rto=None):
+        self.sid = sid
+        self.namespace = namespace
+        self.protocol = protocol
+        # 'json' or 'binary', see wire.py
+        self.wire = 'json'
+        self.sender, self.receiver = make_endpoints(protocol, window_size, seq_bits)
+        # what the middle layer does to frames and acks, see channel.py
+        self.channel = channel if channel is not None else ChannelModel()
+        # retransmission timeout, learnt from the round trips, see rto.py
+        self.rto = rto if rto is not None else RtoEstimator()
+        # the way back when both ends send data, see duplex.py. None for one way transfers
+        self.duplex = None
+        # acks the receiver holds back to send several in one message, see duplex.OwedAcks.
+        # None while every frame is acked on its own
+        self.owed = None
+        self.timers = TimerWheel()
+        # packet number -> (when it last went out, sent only once). Local like the timers
+        self.sent_at = {}
+        # payload transfer, see payload.py : Segmenter at the sender, Reassembler at the receiver.
+        # None while frames carry labels only. Local too, a payload is too big to write through
+        self.outgoing = None
+        self.incoming = None
+
+    def __getstate__(self):
+        # timers hold callbacks and belong to this process, they are not shared
+        return (self.sid, self.namespace, self.protocol, self.wire, self.sender, self.receiver, self.channel, self.rto,
+                self.duplex, self.owed)
+
+    def __setstate__(self, state):
+        (self.sid, self.namespace, self.protocol, self.wire,
+         self.sender, self.receiver, self.channel, self.rto, self.duplex, self.owed) = state
+        self.timers = TimerWheel()
+        self.sent_at = {}
+        self.outgoing = None
+        self.incoming = None
+
+    def __repr__(self):
+        return '<ArqSession %s %s base=%d next=%d>' % (
+            self.namespace, self.sid, self.sender.base, self.sender.next_seq)
+
+
+def _lossless_channel(protocol, seed=None):
+    return ChannelModel(seed=seed)
+
+
+class SessionRegistry(object):
+    """
+    Objective : ArqSession objects keyed by (namespace, sid)
+    Approach  : the namespace names the protocol, '/go-back-N' runs 'go-back-N'.
+                get() opens a fresh session for a connection it has not seen yet,
+                e.g. a client that kept its socket across a server restart.
+                Timer callbacks pass create=False : their connection may have gone
+                meanwhile, closed by another worker or expired from the store.
+                Without a store, get() hands out the same live object every time.
+                With one, get() reloads from the store and save() writes back.
+    Input Parameters:
+        store    : shared store, see store.py. None keeps state in this process only
+        channels : callable(protocol, seed=None) -> ChannelModel for new sessions, default a lossless channel
+        seq_bits : width of the sequence numbers new sessions put on the wire, None for unbounded
+        timeouts : callable() -> RtoEstimator for new sessions
+    """
+
+    def __init__(self, store=None, channels=None, seq_bits=None, timeouts=None):
+        self.store = store
+        self.channels = channels or _lossless_channel
+        self.seq_bits = seq_bits
+        self.timeouts = timeouts or RtoEstimator
+        self._sessions = {}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __iter__(self):
+        return iter(list(self._sessions.values()))
+
+    @staticmethod
+    def _key(sid, namespace):
+        return namespace + '/' + sid
+
+    def open(self, sid, namespace, seed=None, wire=None):
+        state = self._sessions[namespace, sid] = ArqSession(sid, namespace, namespace.strip('/'),
+                                                            channel=self.channels(namespace.strip('/'), seed=seed),
+                                                            seq_bits=self.seq_bits, rto=self.timeouts())
+        if wire is not None:
+            state.wire = wire
+        self.save(state)
+        return state
+
+    def get(self, sid, namespace, create=True):
+        """
+        To : the session of (namespace, sid). One it does not know is opened, or with
+             create=False it is None, and what this worker still held of it is dropped
+        """
+        if self.store is None:
+            state = self._sessions.get((namespace, sid))
+            if state is None and create:
+                state = self.open(sid, namespace)
+            return state
+        data = self.store.load(self._key(sid, namespace))
+        if data is None:
+            if create:
+                return self.open(sid, namespace)
+            local = self._sessions.pop((namespace, sid), None)
+            if local is not None:
+                local.timers.clear()
+            return None
+        state = pickle.loads(data)
+        local = self._sessions.get((namespace, sid))
+        if local is not None:
+            state.timers = local.timers
+            state.sent_at = local.sent_at
+            state.outgoing = local.outgoing
+            state.incoming = local.incoming
+        self._sessions[namespace, sid] = state
+        return state
+
+    def save(self, state):
+        """
+        Task : write sender and receiver through to the shared store, if there is one
+        """
+        if self.store is not None:
+            self.store.save(self._key(state.sid, state.namespace),
+                            pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+
+    def close(self, sid, namespace):
+        state = self._sessions.pop((namespace, sid), None)
+        if state is not None:
+            state.timers.clear()
+        if self.store is not None:
+            self.store.delete(self._key(sid, namespace))
+        return state
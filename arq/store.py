@@ -0,0 +1,73 @@
+"""
+Shared storage for ArqSession state, so more than one worker can serve a namespace.
+
+Both stores hold opaque bytes under string keys :
+    MemoryStore  - a dict, for a single process and for trying things out
+    RedisStore   - any Redis protocol server, e.g. redis-server or fakeredis
+"""
+
+
+class MemoryStore(object):
+    """
+    In process store. Values still go through the same pickling as with Redis,
+    so it behaves like the shared store, just without sharing.
+    """
+
+    def __init__(self):
+        self._data = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def load(self, key):
+        return self._data.get(key)
+
+    def save(self, key, value):
+        self._data[key] = value
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+
+class RedisStore(object):
+    """
+    Objective : Redis backed store
+    Input Parameters:
+        url    : redis://host:port/db, used when no client is given
+        client : an already connected client, e.g. fakeredis.FakeStrictRedis()
+        ttl    : seconds a session survives without any event, so abandoned tabs expire
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', client=None, prefix='arq:', ttl=3600):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError('RedisStore needs the redis package, run `pip install redis`')
+            client = redis.StrictRedis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def load(self, key):
+        return self.client.get(self.prefix + key)
+
+    def save(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def store_from_url(url):
+    """
+    Task : pick a store from a config string. '' or None -> None (keep state in the worker only),
+           'memory' -> MemoryStore, 'redis://...' -> RedisStore
+    """
+    if not url:
+        return None
+    if url == 'memory':
+        return MemoryStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    raise ValueError('unknown state store %r' % url)
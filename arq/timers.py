@@ -0,0 +1,161 @@
+"""
+Hierarchical timing wheel for retransmission timers.
+
+Every packet on the wire has a timer. Arming and cancelling are O(1) dict
+operations, and advancing the clock only touches the bucket of the current
+tick, no matter how many thousands of packets are outstanding.
+"""
+from timeit import default_timer
+
+
+class TimerWheel(object):
+    """
+    Objective : keyed one shot timers, e.g. one per packet number
+    Approach  : `levels` wheels of `slots` buckets each. Level 0 buckets are one
+                tick wide, level 1 buckets are `slots` ticks wide and so on.
+                A far away timer sits in a coarse bucket, and drops down a level
+                each time the finer wheel below it completes a turn.
+    Usage     : wheel.arm(seq, 2.0, resend, seq)   # re-arming replaces the old timer
+                wheel.cancel(seq)                  # ack arrived
+                wheel.advance()                    # fire whatever is due
+    """
+
+    def __init__(self, tick=.01, slots=64, levels=4, clock=default_timer):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self.epoch = clock()
+        # ticks elapsed since epoch, everything up to here has fired
+        self.current = 0
+        self.wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        # key -> (level, bucket) so cancel() knows where to look
+        self.where = {}
+        # clock time the driver next advances the wheel, None while nobody does. See DelayScheduler.drive()
+        self.wake = None
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, key):
+        return key in self.where
+
+    def _now(self):
+        return int((self.clock() - self.epoch) / self.tick)
+
+    def arm(self, key, delay, callback, *args):
+        """
+        Task : call callback(*args) after `delay` seconds, replacing any timer under `key`
+        """
+        self.cancel(key)
+        now = self._now()
+        if not self.where:
+            # nothing pending, skip the idle ticks instead of walking through them later
+            self.current = max(self.current, now)
+        # one extra tick because `now` is rounded down, so timers never fire early
+        ticks = int(delay / self.tick + .999999) + 1
+        self._place(key, max(self.current, now) + ticks, callback, args)
+
+    def _place(self, key, expires, callback, args):
+        # beyond the top wheel, park it in the last top bucket and look again when it cascades
+        due = min(expires, self.current + self.slots ** self.levels - 1)
+        remaining = due - self.current
+        level, span = 0, self.slots
+        while remaining >= span and level < self.levels - 1:
+            level += 1
+            span *= self.slots
+        bucket = (due // (span // self.slots)) % self.slots
+        self.wheels[level][bucket][key] = (expires, callback, args)
+        self.where[key] = (level, bucket)
+
+    def cancel(self, key):
+        """
+        To : True if a timer was pending under `key`
+        """
+        where = self.where.pop(key, None)
+        if where is None:
+            return False
+        del self.wheels[where[0]][where[1]][key]
+        return True
+
+    def rearm(self, key, delay):
+        """
+        Task : restart the timer under `key` to go off `delay` seconds from now, same callback
+        To   : True if a timer was pending under `key`
+        """
+        where = self.where.get(key)
+        if where is None:
+            return False
+        expires, callback, args = self.wheels[where[0]][where[1]][key]
+        self.arm(key, delay, callback, *args)
+        return True
+
+    def cancel_range(self, start, stop):
+        """
+        Task : cancel every key in [start, stop), for cumulative acks
+        """
+        for key in range(start, stop):
+            self.cancel(key)
+
+    def clear(self):
+        """
+        Task : drop every pending timer, e.g. when the connection goes away
+        """
+        for wheel in self.wheels:
+            for bucket in wheel:
+                bucket.clear()
+        self.where.clear()
+
+    def next_due(self):
+        """
+        Task : find the first bucket ahead, at any level, that holds a timer
+        To   : the tick at which advance() next has a timer to fire or a bucket to cascade,
+               None with no timer armed
+        """
+        if not self.where:
+            return None
+        slots = self.slots
+        best = None
+        span = 1
+        for wheel in self.wheels:
+            turn = self.current // span
+            for step in range(1, slots + 1):
+                tick = (turn + step) * span
+                if best is not None and tick >= best:
+                    break
+                if wheel[(turn + step) % slots]:
+                    best = tick
+                    break
+            span *= slots
+        return best
+
+    def advance(self, now=None):
+        """
+        Task : move the wheel to `now` (defaults to the clock), firing due timers in order
+        To   : number of timers fired
+        """
+        target = self._now() if now is None else now
+        slots = self.slots
+        fired = 0
+        while self.current < target:
+            if not self.where:
+                self.current = target
+                break
+            self.current += 1
+            current = self.current
+            # cascade coarser wheels first, they may feed the finer ones
+            for level in range(self.levels - 1, 0, -1):
+                span = slots ** level
+                if current % span == 0:
+                    bucket = self.wheels[level][(current // span) % slots]
+                    self.wheels[level][(current // span) % slots] = {}
+                    for key, (expires, callback, args) in bucket.items():
+                        self._place(key, expires, callback, args)
+            # pop one by one, a callback may cancel or re-arm others in this bucket
+            bucket = self.wheels[0][current % slots]
+            while bucket:
+                key, (expires, callback, args) = bucket.popitem()
+                del self.where[key]
+                callback(*args)
+                fired += 1
+        return fired
@@ -0,0 +1,109 @@
+"""
+Compact binary encoding for frame and ack events.
+
+A JSON event like {"data": "D42", "currentPacket": 42, "currentAck": 42}
+becomes one fixed 21 byte header plus the data bytes, sent as a socket.io
+binary attachment. Layout, big endian :
+
+    currentPacket  uint32
+    currentAck     uint32
+    offset         uint32   replay offset in ms, batches only. A big window at a slow spacing
+                            goes past 65 seconds
+    data length    uint32
+    checksum       uint32   frames in the middle layer, see checksum.py. 0 otherwise
+    flags          uint8    ACK : currentAck is set, otherwise it decodes to None
+                            SACK : ranges follow the data
+    data           utf-8, or raw bytes for payload frames
+    ranges         uint8 count, then count (first, last) uint32 pairs, SACK only
+
+Ack 0 is a real ack once numbers wrap around, hence the flag rather than 0
+standing for none. Ranges are what an ack that stands for several frames
+acks, {"sack": [[3, 5], [7, 7]]} in JSON.
+
+A batch is just records back to back. static/js/wire.js is the same codec
+in JavaScript (encodeWire / decodeWire), for the three protocol pages.
+"""
+import struct
+
+HEADER = struct.Struct('>IIIIIB')
+RANGE = struct.Struct('>II')
+# flags
+ACK = 0x01
+SACK = 0x02
+# ranges one message can carry
+MAX_RANGES = 0xFF
+
+# wire formats a connection can ask for at connect, ?wire=binary
+JSON = 'json'
+BINARY = 'binary'
+
+# binary data, payload frames are memoryview slices
+BYTES = (bytes, bytearray, memoryview)
+
+
+def _pieces(message):
+    data = message.get('data') or b''
+    if not isinstance(data, BYTES):
+        data = str(data).encode('utf-8')
+    currentAck = message.get('currentAck')
+    sack = message.get('sack')
+    flags = (ACK if currentAck is not None else 0) | (SACK if sack else 0)
+    try:
+        header = HEADER.pack(int(message.get('currentPacket') or 0), int(currentAck or 0),
+                             int(message.get('offset') or 0), len(data), int(message.get('checksum') or 0), flags)
+    except struct.error as error:
+        raise ValueError('frame does not fit the wire header, numbers and data length are unsigned 32 bit : %s' % error)
+    if not sack:
+        return header, data
+    sack = sack[:MAX_RANGES]
+    return header, data, bytes((len(sack),)) + b''.join(RANGE.pack(first, last) for first, last in sack)
+
+
+def encode(message):
+    """
+    Task : one event payload dict -> bytes
+    """
+    return b''.join(_pieces(message))
+
+
+def encode_batch(messages):
+    # headers and data, payload slices included, are copied once, into the joined buffer
+    return b''.join(piece for message in messages for piece in _pieces(message))
+
+
+def decode_all(buffer, raw=False):
+    """
+    Task : bytes -> list of event payload dicts, in the same shape the JSON events have.
+           raw=True leaves data as bytes, for payload frames
+    """
+    view = memoryview(buffer)
+    messages = []
+    at = 0
+    while at < len(view):
+        currentPacket, currentAck, offset, length, checksum, flags = HEADER.unpack_from(view, at)
+        at += HEADER.size
+        data = bytes(view[at:at + length])
+        message = {
+            'data': data if raw else data.decode('utf-8'),
+            'currentPacket': currentPacket,
+            'currentAck': currentAck if flags & ACK else None,
+            'offset': offset,
+            'checksum': checksum,
+        }
+        at += length
+        if flags & SACK:
+            count = view[at]
+            message['sack'] = [list(RANGE.unpack_from(view, at + 1 + i * RANGE.size)) for i in range(count)]
+            at += 1 + count * RANGE.size
+        messages.append(message)
+    return messages
+
+
+def decode(message, raw=False):
+    """
+    Task : accept either wire format, so handlers stay oblivious.
+           Binary payloads are decoded, dicts are passed through.
+    """
+    if isinstance(message, BYTES):
+        return decode_all(message, raw)[0]
+    return message
@@ -0,0 +1,3 @@
+"""
+Load and micro benchmarks, run as modules : python -m benchmarks.<name>
+"""
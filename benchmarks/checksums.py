@@ -0,0 +1,81 @@
+"""
+Checksum throughput in MB/s, for every frame checksum and a few frame sizes.
+
+    python -m benchmarks.checksums
+    python -m benchmarks.checksums --sizes 64,1024 --seconds 0.5
+
+    crc32         zlib.crc32, what the middle layer stamps by default
+    crc16         binascii.crc_hqx, CRC-16/CCITT in C
+    crc16_table   the same CRC-16, table driven in python
+    frame_crc32   frame_checksum() as the handlers call it : header, then data
+
+Every figure is the best of --repeat runs, each of which keeps going over
+the same frame for at least --seconds.
+"""
+import argparse
+import json
+import os
+import sys
+from timeit import default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arq.checksum import crc16_ccitt, crc16_ccitt_table, crc32, frame_checksum
+
+SIZES = (64, 1024, 16384, 65535)
+
+ALGORITHMS = {
+    'crc32': crc32,
+    'crc16': crc16_ccitt,
+    'crc16_table': crc16_ccitt_table,
+    'frame_crc32': lambda data: frame_checksum(42, data),
+}
+
+
+def throughput(function, data, seconds):
+    """
+    To : MB/s of function(data), over at least `seconds`
+    """
+    rounds = 0
+    started = default_timer()
+    while True:
+        for _ in range(16):
+            function(data)
+        rounds += 16
+        took = default_timer() - started
+        if took >= seconds:
+            return rounds * len(data) / took / 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--algorithms', default=','.join(sorted(ALGORITHMS)))
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES), help='frame sizes in bytes')
+    parser.add_argument('--seconds', type=float, default=.2, help='least time per run')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per figure, the best one counts')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    algorithms = [name for name in args.algorithms.split(',') if name]
+    unknown = [name for name in algorithms if name not in ALGORITHMS]
+    if unknown:
+        parser.error('unknown algorithm %s, choose from %s' % (', '.join(unknown), ', '.join(sorted(ALGORITHMS))))
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    results = {}
+    for name in algorithms:
+        for size in sizes:
+            data = os.urandom(size)
+            results['%s/%d' % (name, size)] = round(max(
+                throughput(ALGORITHMS[name], data, args.seconds) for _ in range(args.repeat)), 1)
+
+    if args.json:
+        print(json.dumps(results, indent=1))
+    else:
+        for key, value in results.items():
+            print('%-24s %10.1f MB/s' % (key, value))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Micro benchmarks of the hot handler paths, with a JSON history and a regression gate.
+
+Each case replays what one socket handler does to the state machines and the
+timer wheel, minus the socket, for sessions of 10^3 up to 10^6 frames :
+
+    gbn_ack_at_sender      on_sendAckToSenderBackend under go back N : slide, cancel timers, arm the refill
+    sr_timer_blast         retransmission_timer_blast under selective repeat, every frame times out once
+    burst_window_setup     on_sendPacketToSenderBackendBurst : size the window, load, encode the first batch
+    gbn_receiver_in_order  on_sendPacketToReceiverBackend under go back N, 1% of frames lost
+    sr_receiver_reorder    the same under selective repeat, windows shuffled, 10% duplicates
+
+    python -m benchmarks.handlers                        # run, compare, append to the history
+    python -m benchmarks.handlers --sizes 1000,10000 --cases gbn_ack_at_sender
+    python -m benchmarks.handlers --threshold 0.1 --no-record
+
+Every run is compared against the median of the last --baseline runs in the
+history that came from the same machine, python and --window, and exits 1 if any case
+got slower than the threshold allows. Timings are per machine, so the history
+file is not committed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from timeit import default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arq import (GoBackNSender, GoBackNReceiver, SelectiveRepeatSender, SelectiveRepeatReceiver,
+                 TimerWheel, make_endpoints, wire)
+
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.json')
+SIZES = (1000, 10000, 100000, 1000000)
+RETRANSMIT_TIMEOUT = 2.0
+
+
+def _noop(*args):
+    pass
+
+
+def _frozen_wheel():
+    # the clock never moves, so timers are armed and cancelled but never fire
+    return TimerWheel(clock=lambda: 0.0)
+
+
+# ################################## Cases #####################################
+# setup(frames, window) -> (run, operations). Only run() is timed.
+
+def gbn_ack_at_sender(frames, window):
+    sender = GoBackNSender(window)
+    timers = _frozen_wheel()
+
+    def run():
+        for seq in sender.load(frames):
+            timers.arm(seq, RETRANSMIT_TIMEOUT, _noop, seq)
+        for ack in range(1, frames + 1):
+            base = sender.base
+            refill = sender.on_ack(ack)
+            timers.cancel_range(base, sender.base)
+            timers.cancel(ack)
+            for seq in refill:
+                timers.arm(seq, RETRANSMIT_TIMEOUT, _noop, seq)
+
+    return run, frames
+
+
+def sr_timer_blast(frames, window):
+    sender = SelectiveRepeatSender(window)
+    timers = _frozen_wheel()
+
+    def run():
+        for seq in sender.load(frames):
+            timers.arm(seq, RETRANSMIT_TIMEOUT, _noop, seq)
+        for seq in range(1, frames + 1):
+            for resend in sender.on_timeout(seq):
+                timers.arm(resend, RETRANSMIT_TIMEOUT, _noop, resend)
+            refill = sender.on_ack(seq)
+            timers.cancel(seq)
+            for fresh in refill:
+                timers.arm(fresh, RETRANSMIT_TIMEOUT, _noop, fresh)
+
+    return run, frames
+
+
+def burst_window_setup(frames, window, sessions=1000):
+    # the cost must not grow with the session, only with the window
+    def run():
+        for _ in range(sessions):
+            sender, receiver = make_endpoints('go-back-N', 1)
+            sender.window_size = receiver.window_size = window
+            packets = [{'data': 'D' + str(n), 'currentPacket': n, 'offset': i * 50}
+                       for i, n in enumerate(sender.load(frames))]
+            wire.encode_batch(packets)
+
+    return run, sessions
+
+
+def gbn_receiver_in_order(frames, window, loss=.01, seed=1):
+    # what go back N puts on the wire : after a loss the rest of the window
+    # arrives out of order, then the whole window again from the lost frame
+    rng = random.Random(seed)
+    arrivals = []
+    base = 1
+    while base <= frames:
+        top = min(base + window, frames + 1)
+        lost = next((seq for seq in range(base, top) if rng.random() < loss), None)
+        arrivals.extend(seq for seq in range(base, top) if seq != lost)
+        base = top if lost is None else lost
+    receiver = GoBackNReceiver(window)
+
+    def run():
+        on_frame = receiver.on_frame
+        for seq in arrivals:
+            on_frame(seq)
+
+    return run, len(arrivals)
+
+
+def sr_receiver_reorder(frames, window, duplicate=.1, seed=1):
+    # every window arrives shuffled, and a frame whose ack got lost arrives twice
+    rng = random.Random(seed)
+    arrivals = []
+    for start in range(1, frames + 1, window):
+        batch = list(range(start, min(start + window, frames + 1)))
+        batch.extend(seq for seq in list(batch) if rng.random() < duplicate)
+        rng.shuffle(batch)
+        arrivals.extend(batch)
+    receiver = SelectiveRepeatReceiver(window)
+
+    def run():
+        on_frame = receiver.on_frame
+        for seq in arrivals:
+            on_frame(seq, seq)
+
+    return run, len(arrivals)
+
+
+CASES = {
+    'gbn_ack_at_sender': gbn_ack_at_sender,
+    'sr_timer_blast': sr_timer_blast,
+    'burst_window_setup': burst_window_setup,
+    'gbn_receiver_in_order': gbn_receiver_in_order,
+    'sr_receiver_reorder': sr_receiver_reorder,
+}
+
+
+# ################################## Running #####################################
+
+def measure(case, frames, window, repeat):
+    """
+    Task : best of `repeat` fresh runs, the least disturbed one
+    To   : nanoseconds per operation
+    """
+    best = None
+    for _ in range(repeat):
+        run, operations = CASES[case](frames, window)
+        started = default_timer()
+        run()
+        took = (default_timer() - started) / operations * 1e9
+        best = took if best is None else min(best, took)
+    return best
+
+
+def machine():
+    return '%s/%s %s' % (platform.node(), platform.machine(), platform.python_version())
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as history:
+        return json.load(history)
+
+
+def baseline(history, key, window, runs):
+    """
+    Task : median ns/op of `key` over the last `runs` runs of this machine with the same window
+    """
+    here = machine()
+    values = [entry['results'][key] for entry in history
+              if entry['machine'] == here and entry.get('window') == window and key in entry['results']][-runs:]
+    if not values:
+        return None
+    values.sort()
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cases', default=','.join(sorted(CASES)))
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES), help='frames per session')
+    parser.add_argument('--window', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the best one counts')
+    parser.add_argument('--history', default=HISTORY)
+    parser.add_argument('--baseline', type=int, default=5, help='compare against the median of this many past runs')
+    parser.add_argument('--threshold', type=float, default=.25, help='allowed slowdown, 0.25 is 25%%')
+    parser.add_argument('--no-record', action='store_true', help='compare only, do not append to the history')
+    parser.add_argument('--json', action='store_true', help='print this run as JSON')
+    args = parser.parse_args(argv)
+
+    cases = [case for case in args.cases.split(',') if case]
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        parser.error('unknown case %s, choose from %s' % (', '.join(unknown), ', '.join(sorted(CASES))))
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    history = load_history(args.history)
+    results, regressions, lines = {}, [], []
+    for case in cases:
+        for frames in sizes:
+            key = '%s/%d' % (case, frames)
+            results[key] = round(measure(case, frames, args.window, args.repeat), 1)
+            before = baseline(history, key, args.window, args.baseline)
+            change = results[key] / before - 1 if before else None
+            if change is not None and change > args.threshold:
+                regressions.append(key)
+            lines.append('%-32s %12.1f ns/op %s' % (key, results[key],
+                                                    '' if change is None else '%+7.1f%%' % (change * 100)))
+
+    entry = {'ts': round(time.time(), 3), 'revision': revision(), 'machine': machine(),
+             'window': args.window, 'results': results}
+    if args.json:
+        print(json.dumps(dict(entry, regressions=regressions), indent=1))
+    else:
+        print('\n'.join(lines))
+        for key in regressions:
+            print('REGRESSION %s is more than %d%% slower than its baseline' % (key, args.threshold * 100))
+
+    if not args.no_record:
+        history.append(entry)
+        with open(args.history, 'w') as output:
+            json.dump(history, output, indent=1)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,429 @@
+"""
+Load generator : many headless clients that speak the same events as the templates.
+
+Every simulated client connects to one protocol namespace, does the receiver
+handshake, sends its packets (a burst for the sliding window protocols, one
+at a time for stop and wait) and relays frames and acks through the middle
+layer and the receiver, exactly like the three browser panes would.
+
+    python -m benchmarks.loadgen --clients 200 --packets 50
+    python -m benchmarks.loadgen --url http://localhost:5000 --clients 100 --namespaces /go-back-N
+    python -m benchmarks.loadgen --clients 10 --payload 1048576 --mtu 1024     # goodput in bytes per second
+
+With --payload every client sends that many generated bytes instead of
+labelled packets, and the report adds the payload goodput and whether every
+payload arrived intact.
+
+With --reverse every receiver sends that many packets back during the burst,
+and acks ride on the frames going the other way. ack_events_per_frame, acks
+that crossed the middle layer on their own per frame delivered, shows what
+that saves :
+
+    python -m benchmarks.loadgen --clients 20 --namespaces /go-back-N --packets 50
+    python -m benchmarks.loadgen --clients 20 --namespaces /go-back-N --packets 50 --reverse 50
+
+The same figure shows what ack coalescing saves, ACK_EVERY is read by the
+app :
+
+    ACK_EVERY=8 python -m benchmarks.loadgen --namespaces /go-back-N,/selective-repeat --window 16
+
+Without --url the app is imported and driven through the Flask-SocketIO test
+client, and handler latency is timed around every emit. With --url a real
+server is driven through python-socketio's Client (python-socketio >= 4), and
+latency comes from the server's own /metrics histograms.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+NAMESPACES = ('/stop-and-wait', '/go-back-N', '/selective-repeat')
+# events the pages send as JSON whatever the wire format
+JSON_EVENTS = ('connectionRequestToMiddleLayerBackend', 'connectionRequestToSenderBackend',
+               'sendPacketToSenderBackendBurst', 'sendPacketToSenderBackend', 'sendPayloadToSenderBackend')
+# events that carry a batch of packets, {'packets': [...]} in JSON
+BATCH_EVENTS = ('sendPacketBatchToSenderFrontend', 'sendReversePacketBatchToReceiverFrontend')
+# an ack that went through the middle layer on its own, whatever became of it
+ACK_EVENTS = ('sendAckToMiddleLayerFrontend', 'sendCorruptedAckToMiddleLayerFrontend',
+              'sendReverseAckToMiddleLayerFrontend', 'ackDroppedAtMiddleLayer')
+
+
+def relay(event, message, **fields):
+    """
+    Task : a frame on to the next hop, with its piggybacked ack if it carries one
+    """
+    fields.update(data=message['data'], currentPacket=message['currentPacket'])
+    if message.get('currentAck') is not None:
+        fields['currentAck'] = message['currentAck']
+    return (event, fields)
+
+
+class SimulatedClient(object):
+    """
+    Objective : the three panes of one protocol page, minus the DOM
+    Approach  : react() takes one server event and returns what the page would emit back
+    """
+
+    def __init__(self, namespace, packets, window_size, payload=None, mtu=None, reverse=0):
+        self.namespace = namespace
+        self.packets = packets
+        self.window_size = window_size
+        # payload mode : bytes to send and bytes per frame, see sendPayloadToSenderBackend
+        self.payload = payload
+        self.mtu = mtu
+        # two way mode : packets the receiver sends back, see arq/duplex.py
+        self.reverse = reverse
+        self.completed = set()
+        self.intact = None
+        self.sent = 0
+        self.last_ack = None
+        self.acks = 0
+        self.done = False
+        self.started = self.finished = None
+
+    @property
+    def frames(self):
+        """
+        To : frames this client's transfer puts on the wire, both ways. In payload mode the ones the
+             server's Segmenter cuts the payload into, with the mtu capped as sendPayloadToSenderBackend does
+        """
+        if self.payload is None:
+            return self.packets + self.reverse
+        from arq.payload import frame_count
+        return frame_count(self.payload, min(self.mtu or int(os.environ.get('PAYLOAD_MTU', 1024)), 0xFFFF))
+
+    def start(self):
+        self.started = time.time()
+        return [('connectionRequestToMiddleLayerBackend', {'data': 'Hi Sender!'})]
+
+    def _begin(self):
+        if self.payload is not None:
+            return [('sendPayloadToSenderBackend', {'size': self.payload, 'mtu': self.mtu,
+                                                    'windowSize': self.window_size})]
+        if self.reverse:
+            return [('sendPacketToSenderBackendBurst', {'totalNumberOfPackets': self.packets,
+                                                        'windowSize': self.window_size,
+                                                        'reversePackets': self.reverse})]
+        if self.namespace == '/stop-and-wait':
+            return self._next_saw_packet()
+        return [('sendPacketToSenderBackendBurst',
+                 {'totalNumberOfPackets': self.packets, 'windowSize': self.window_size})]
+
+    def _next_saw_packet(self):
+        if self.sent >= self.packets:
+            self._finish()
+            return []
+        self.sent += 1
+        return [('sendPacketToSenderBackend', {'data': 'packet %d' % self.sent})]
+
+    def _finish(self):
+        if not self.done:
+            self.done = True
+            self.finished = time.time()
+
+    def react(self, name, message):
+        if name in ACK_EVENTS:
+            self.acks += 1
+        if name == 'connectionRequestToMiddleLayerFrontend':
+            return [('connectionRequestToSenderBackend', {'data': message['data']})]
+        if name == 'connectionRequestToSenderFrontend':
+            return self._begin()
+        if name == 'sendPacketBatchToSenderFrontend':
+            # the page replays them at their offsets, a load test does not wait
+            return [relay('SendPacketToMiddleLayerBackend', packet) for packet in message['packets']]
+        if name == 'sendPacketToSenderFrontend':
+            return [relay('SendPacketToMiddleLayerBackend', message)]
+        if name == 'SendPacketToMiddleLayerFrontend':
+            return [relay('sendPacketToReceiverBackend', message, checksum=message.get('checksum'))]
+        if name == 'sendReversePacketBatchToReceiverFrontend':
+            return [relay('SendReversePacketToMiddleLayerBackend', packet) for packet in message['packets']]
+        if name == 'sendReversePacketToReceiverFrontend':
+            return [relay('SendReversePacketToMiddleLayerBackend', message)]
+        if name == 'SendReversePacketToMiddleLayerFrontend':
+            return [relay('sendReversePacketToSenderBackend', message, checksum=message.get('checksum'))]
+        if name == 'sendReverseAckToMiddleLayerFrontend':
+            return [('sendReverseAckToReceiverBackend', message)]
+        if name == 'sendCorruptedPacketToReceiverFrontend':
+            # the frame failed its checksum, ask for it again
+            return [('sendNegAckToSenderBackend', {'data': 'Negative Ack for Packet : D%s' % message['currentPacket'],
+                                                   'currentPacket': message['currentPacket'],
+                                                   'currentAck': message['currentPacket']})]
+        if name == 'sendPacketToReceiverFrontend' and message['currentAck'] is not None:
+            # no ack when the server coalesces them, see ACK_EVERY
+            return [('sendAckToMiddleLayerBackend', {'data': 'Ack for Packet : D%s' % message['currentPacket'],
+                                                     'currentPacket': message['currentPacket'],
+                                                     'currentAck': message['currentAck'],
+                                                     'sack': message.get('sack')})]
+        if name == 'sendRejectedPacketToReceiverFrontend' and message['currentAck'] is not None:
+            # go back N repeats its cumulative ack for an out of order frame
+            return [('sendAckToMiddleLayerBackend', {'data': 'Duplicate Ack for Packet : D%s' % message['currentAck'],
+                                                     'currentPacket': message['currentAck'],
+                                                     'currentAck': message['currentAck']})]
+        if name == 'sendAckToMiddleLayerFrontend':
+            return [('sendAckToSenderBackend', message)]
+        if name == 'sendCorruptedAckToMiddleLayerFrontend':
+            return [('sendNegAckToSenderBackend', message)]
+        if name == 'sendPayloadCompleteToReceiverFrontend':
+            self.intact = message['intact']
+        if name == 'sendAckToSenderFrontend' and self.namespace == '/stop-and-wait' and self.payload is None:
+            # the page sends the next packet once the previous one is acked.
+            # numbers may wrap around, so only a repeat of the last ack is a duplicate
+            if message['currentAck'] != self.last_ack:
+                self.last_ack = message['currentAck']
+                return self._next_saw_packet()
+        if name in ('sendCompletionMessage', 'sendReverseCompletionMessage') and self.reverse:
+            # both ways have to be through
+            self.completed.add(name)
+            if len(self.completed) == 2:
+                self._finish()
+        elif name == 'sendCompletionMessage' and (self.namespace != '/stop-and-wait' or self.payload is not None):
+            self._finish()
+        return []
+
+
+# ################################## stats #####################################
+
+def percentile(ordered, share):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def histogram_percentile(buckets, share):
+    """
+    Task : quantile from cumulative (upper bound, count) pairs, interpolated within the bucket
+    """
+    if not buckets or not buckets[-1][1]:
+        return None
+    wanted = share * buckets[-1][1]
+    lower, below = 0.0, 0
+    for bound, count in buckets:
+        if count >= wanted:
+            if bound == float('inf'):
+                return lower
+            return lower + (bound - lower) * (wanted - below) / max(count - below, 1)
+        lower, below = bound, count
+    return lower
+
+
+def handler_buckets(text, namespaces):
+    """
+    Task : /metrics text -> cumulative arq_handler_seconds buckets summed over events of the namespaces
+    """
+    totals = {}
+    for line in text.splitlines():
+        if not line.startswith('arq_handler_seconds_bucket{'):
+            continue
+        labels, value = line[len('arq_handler_seconds_bucket{'):].rsplit('} ', 1)
+        fields = dict(part.split('=', 1) for part in labels.split(','))
+        if fields['namespace'].strip('"') not in namespaces:
+            continue
+        bound = float(fields['le'].strip('"').replace('+Inf', 'inf'))
+        totals[bound] = totals.get(bound, 0) + float(value)
+    return sorted(totals.items())
+
+
+def report(clients, events, errors, elapsed, latencies=None, buckets=None):
+    finished = [client for client in clients if client.done]
+    result = {
+        'clients': len(clients),
+        'finished': len(finished),
+        # a session that never completes is a hang, not a handler error
+        'incomplete': len(clients) - len(finished),
+        'errors': errors,
+        'events': events,
+        'seconds': round(elapsed, 3),
+        'events_per_second': round(events / elapsed, 1) if elapsed else None,
+    }
+    if latencies is not None:
+        latencies = sorted(latencies)
+        result['p50_ms'] = round(percentile(latencies, .5) * 1000, 3) if latencies else None
+        result['p99_ms'] = round(percentile(latencies, .99) * 1000, 3) if latencies else None
+    elif buckets:
+        result['p50_ms'] = round(histogram_percentile(buckets, .5) * 1000, 3)
+        result['p99_ms'] = round(histogram_percentile(buckets, .99) * 1000, 3)
+    frames = sum(client.frames for client in finished)
+    result['ack_events'] = sum(client.acks for client in clients)
+    result['ack_events_per_frame'] = round(sum(client.acks for client in finished) / frames, 3) if frames else None
+    if clients and clients[0].payload is not None:
+        moved = sum(client.payload for client in finished)
+        result['payload_bytes'] = moved
+        result['goodput_bytes_per_second'] = round(moved / elapsed, 1) if elapsed else None
+        # a finished sender whose receiver never reported is as bad as a checksum mismatch
+        result['payloads_intact'] = sum(1 for client in finished if client.intact)
+    if finished:
+        result['mean_session_seconds'] = round(
+            sum(client.finished - client.started for client in finished) / len(finished), 3)
+    return result
+
+
+# ################################## drivers #####################################
+
+def run_in_process(clients, wire_format, deadline):
+    """
+    Objective : drive app.py in this process through the Flask-SocketIO test client
+    To        : (events, errors, handler latencies in seconds)
+    """
+    import app
+    from arq import wire
+
+    binary = wire_format == wire.BINARY
+    latencies = []
+    counters = {'events': 0, 'errors': 0}
+    sockets = [app.socketio.test_client(app.app, namespace=client.namespace,
+                                        query_string='wire=binary' if binary else '')
+               for client in clients]
+
+    def send(socket, client, outgoing):
+        for event, message in outgoing:
+            if binary and event not in JSON_EVENTS:
+                message = wire.encode(message)
+            started = time.time()
+            try:
+                socket.emit(event, message, namespace=client.namespace)
+            except Exception:
+                counters['errors'] += 1
+            latencies.append(time.time() - started)
+            counters['events'] += 1
+
+    for socket, client in zip(sockets, clients):
+        socket.get_received(client.namespace)
+        send(socket, client, client.start())
+
+    while time.time() < deadline and not all(client.done for client in clients):
+        idle = True
+        for socket, client in zip(sockets, clients):
+            for received in socket.get_received(client.namespace):
+                idle = False
+                message = received['args'][0] if received['args'] else None
+                if isinstance(message, (bytes, bytearray)):
+                    records = wire.decode_all(message, raw=client.payload is not None)
+                    message = {'packets': records} if received['name'] in BATCH_EVENTS else records[0]
+                send(socket, client, client.react(received['name'], message))
+        if idle:
+            app.socketio.sleep(.005)
+
+    for socket, client in zip(sockets, clients):
+        socket.disconnect(namespace=client.namespace)
+    return counters['events'], counters['errors'], latencies
+
+
+def run_remote(url, clients, wire_format, deadline):
+    """
+    Objective : drive a running server over real websockets
+    To        : (events, errors)
+    """
+    try:
+        import socketio
+        socketio.Client
+    except (ImportError, AttributeError):
+        raise RuntimeError('--url needs python-socketio >= 4 for its Client, run `pip install "python-socketio[client]"`')
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from arq import wire
+
+    binary = wire_format == wire.BINARY
+    lock = threading.Lock()
+    counters = {'events': 0, 'errors': 0}
+    connections = []
+
+    def attach(sio, client):
+        def send(outgoing):
+            for event, message in outgoing:
+                if binary and event not in JSON_EVENTS:
+                    message = wire.encode(message)
+                try:
+                    sio.emit(event, message, namespace=client.namespace)
+                except Exception:
+                    with lock:
+                        counters['errors'] += 1
+                with lock:
+                    counters['events'] += 1
+
+        def on_any(event, message=None):
+            if isinstance(message, (bytes, bytearray)):
+                records = wire.decode_all(message, raw=client.payload is not None)
+                message = {'packets': records} if event in BATCH_EVENTS else records[0]
+            send(client.react(event, message))
+
+        sio.on('*', on_any, namespace=client.namespace)
+        return send
+
+    for client in clients:
+        sio = socketio.Client(reconnection=False)
+        send = attach(sio, client)
+        try:
+            sio.connect(url + ('?wire=binary' if binary else ''), namespaces=[client.namespace])
+        except Exception:
+            counters['errors'] += 1
+            continue
+        connections.append(sio)
+        send(client.start())
+
+    while time.time() < deadline and not all(client.done for client in clients):
+        time.sleep(.05)
+    for sio in connections:
+        sio.disconnect()
+    return counters['events'], counters['errors']
+
+
+def fetch_metrics(url):
+    from urllib.request import urlopen
+    try:
+        return urlopen(url.rstrip('/') + '/metrics', timeout=10).read().decode('utf-8')
+    except Exception:
+        return ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='drive a running server, e.g. http://localhost:5000. Default : in process')
+    parser.add_argument('--clients', type=int, default=100, help='concurrent clients per namespace')
+    parser.add_argument('--namespaces', default=','.join(NAMESPACES))
+    parser.add_argument('--packets', type=int, default=20, help='packets per client')
+    parser.add_argument('--window', type=int, default=4)
+    parser.add_argument('--wire', choices=('json', 'binary'), default='json')
+    parser.add_argument('--payload', type=int, help='send this many generated bytes per client instead of packets')
+    parser.add_argument('--mtu', type=int, default=1024, help='payload bytes per frame')
+    parser.add_argument('--reverse', type=int, default=0, help='packets every receiver sends back, acks piggyback')
+    parser.add_argument('--timeout', type=float, default=120, help='give up after this many seconds')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    namespaces = [namespace for namespace in args.namespaces.split(',') if namespace]
+    if args.reverse and args.payload is not None:
+        parser.error('--reverse sends packets, not a payload')
+    clients = [SimulatedClient(namespace, args.packets, args.window, args.payload, args.mtu, args.reverse)
+               for namespace in namespaces for _ in range(args.clients)]
+
+    if args.url:
+        before = handler_buckets(fetch_metrics(args.url), namespaces)
+        started = time.time()
+        events, errors = run_remote(args.url, clients, args.wire, started + args.timeout)
+        elapsed = time.time() - started
+        after = dict(handler_buckets(fetch_metrics(args.url), namespaces))
+        buckets = [(bound, after.get(bound, 0) - count) for bound, count in before] or sorted(after.items())
+        result = report(clients, events, errors, elapsed, buckets=buckets)
+    else:
+        # the in process server should not sit on its visual delays
+        os.environ.setdefault('CHANNEL_DELAY', '0')
+        os.environ.setdefault('BURST_SPACING', '0')
+        os.environ.setdefault('RETRANSMIT_TIMEOUT', '0.5')
+        # nor back off for seconds on its very lossy default channel
+        os.environ.setdefault('RTO_MAX', '1')
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        started = time.time()
+        events, errors, latencies = run_in_process(clients, args.wire, started + args.timeout)
+        result = report(clients, events, errors, time.time() - started, latencies=latencies)
+
+    if args.json:
+        print(json.dumps(result, indent=1))
+    else:
+        for key, value in result.items():
+            print('%-26s %s' % (key, value))
+    return 0 if not result['errors'] and not result['incomplete'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Production entry point. `python app.py` stays the dev server.
+
+Binds $PORT before importing anything heavy, so heroku sees the port within
+its 60 second boot window, then serves app.py with gevent or eventlet.
+
+One process serves one port. Socket.IO needs every request of a session to
+reach the process that holds it, so workers sharing a listening socket do
+not work : to scale out, run one server.py per port behind a load balancer
+with sticky sessions, and share SOCKETIO_MESSAGE_QUEUE and ARQ_STATE_STORE
+between them, see README.
+
+Environment :
+    PORT             port to bind, default 5000
+    ASYNC_MODE       "gevent" (default) or "eventlet"
+    MAX_CONNECTIONS  open connections, default 20000
+    BACKLOG          listen backlog, default 2048
+    WEB_CONCURRENCY  ignored, heroku sets it. One process per port, see above
+"""
+import os
+import sys
+
+ASYNC_MODE = os.environ.setdefault('ASYNC_MODE', 'gevent')
+PORT = int(os.environ.get('PORT', 5000))
+MAX_CONNECTIONS = int(os.environ.get('MAX_CONNECTIONS', 20000))
+BACKLOG = int(os.environ.get('BACKLOG', 2048))
+
+# ################################# Monkey patching ######################################
+# has to happen before anything else imports socket, threading or time
+
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+elif ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+else:
+    sys.exit('ASYNC_MODE must be "gevent" or "eventlet", not %r' % ASYNC_MODE)
+
+import resource
+import socket
+
+
+def log(*args):
+    print('[server %d]' % os.getpid(), *args)
+    sys.stdout.flush()
+
+
+def raise_file_limit(wanted):
+    """
+    Task : every websocket is a file descriptor, lift the soft limit as far as allowed
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    if soft < target:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def bind(port):
+    """
+    Task : open the listening socket right away, connections wait in the backlog
+           until the app is imported
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('0.0.0.0', port))
+    listener.listen(BACKLOG)
+    return listener
+
+
+# ################################# Serving ######################################
+
+def serve_gevent(listener, app):
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+    try:
+        from geventwebsocket.handler import WebSocketHandler
+    except ImportError:
+        log('gevent-websocket not installed, clients will fall back to long polling')
+        WebSocketHandler = None
+    kwargs = {'handler_class': WebSocketHandler} if WebSocketHandler else {}
+    WSGIServer(listener, app, spawn=Pool(MAX_CONNECTIONS), log=None, **kwargs).serve_forever()
+
+
+def serve_eventlet(listener, app):
+    import eventlet.wsgi
+    eventlet.wsgi.server(listener, app, max_size=MAX_CONNECTIONS, log_output=False)
+
+
+if __name__ == '__main__':
+    listener = bind(PORT)
+    log('bound 0.0.0.0:%d, loading app' % PORT)
+
+    limit = raise_file_limit(MAX_CONNECTIONS + 1024)
+    if int(os.environ.get('WEB_CONCURRENCY', 1)) > 1:
+        log('WEB_CONCURRENCY ignored, one process per port : run more behind a sticky load balancer')
+    # the app starts its log thread and message queue client on import, in this one process
+    from app import app, socketio
+
+    log('ready on port %d, async_mode=%s, max %d connections, %d open files allowed' % (
+        PORT, socketio.async_mode, MAX_CONNECTIONS, limit))
+    if ASYNC_MODE == 'gevent':
+        serve_gevent(listener, app)
+    else:
+        serve_eventlet(listener, app)
@@ -0,0 +1,70 @@
+// Binary wire format of frame and ack events, the JavaScript side of arq/wire.py.
+// Frames and acks travel as a 21 byte header instead of JSON, once the server agrees at connect.
+// Same layout as arq/wire.py, big endian :
+// currentPacket uint32 | currentAck uint32 | offset uint32 | data length uint32 | checksum uint32 |
+// flags uint8 (1 : currentAck is set, null otherwise. 2 : sack follows) | data utf-8 |
+// sack : uint8 count, then count (first, last) uint32 pairs, the ranges a coalesced ack acks
+
+function encodeWire(message) {
+    /*
+      Objective : event payload -> ArrayBuffer
+      */
+    var data = unescape(encodeURIComponent(message["data"] || ""));
+    var sack = (message["sack"] || []).slice(0, 255);
+    var buffer = new ArrayBuffer(21 + data.length + (sack.length ? 1 + 8 * sack.length : 0));
+    var hasAck = message["currentAck"] !== null && message["currentAck"] !== undefined;
+    var view = new DataView(buffer);
+    view.setUint32(0, message["currentPacket"] || 0);
+    view.setUint32(4, message["currentAck"] || 0);
+    view.setUint32(8, message["offset"] || 0);
+    view.setUint32(12, data.length);
+    view.setUint32(16, message["checksum"] || 0);
+    view.setUint8(20, (hasAck ? 1 : 0) | (sack.length ? 2 : 0));
+    for (var i = 0; i < data.length; i++) {
+        view.setUint8(21 + i, data.charCodeAt(i));
+    }
+    if (sack.length) {
+        var at = 21 + data.length;
+        view.setUint8(at, sack.length);
+        for (var j = 0; j < sack.length; j++) {
+            view.setUint32(at + 1 + 8 * j, sack[j][0]);
+            view.setUint32(at + 5 + 8 * j, sack[j][1]);
+        }
+    }
+    return buffer;
+}
+
+function decodeWire(buffer) {
+    /*
+      Objective : ArrayBuffer -> list of event payloads, one per record
+      */
+    var view = new DataView(buffer);
+    var messages = [];
+    var at = 0;
+    while (at < buffer.byteLength) {
+        var length = view.getUint32(at + 12);
+        var data = "";
+        for (var i = 0; i < length; i++) {
+            data += String.fromCharCode(view.getUint8(at + 21 + i));
+        }
+        var flags = view.getUint8(at + 20);
+        var message = {
+            currentPacket: view.getUint32(at),
+            currentAck: flags & 1 ? view.getUint32(at + 4) : null,
+            offset: view.getUint32(at + 8),
+            checksum: view.getUint32(at + 16),
+            data: decodeURIComponent(escape(data))
+        };
+        at += 21 + length;
+        if (flags & 2) {
+            var count = view.getUint8(at);
+            message.sack = [];
+            for (var j = 0; j < count; j++) {
+                message.sack.push([view.getUint32(at + 1 + 8 * j), view.getUint32(at + 5 + 8 * j)]);
+            }
+            at += 1 + 8 * count;
+        }
+        messages.push(message);
+    }
+    return messages;
+}
@@ -0,0 +1,164 @@
+"""
+Round trips of ArqSession state through the shared stores, see arq/store.py and arq/state.py.
+
+    python -m unittest discover tests
+
+The RedisStore cases run against fakeredis, `pip install fakeredis`, and are
+skipped without it.
+"""
+import pickle
+import time
+import unittest
+
+from arq.payload import Reassembler, Segmenter
+from arq.state import ArqSession, SessionRegistry
+from arq.store import MemoryStore, RedisStore, store_from_url
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+SID = 'sid-1'
+NAMESPACE = '/go-back-N'
+
+
+def _noop(*args):
+    pass
+
+
+class StoreRoundTrips(object):
+    """
+    Objective : the same checks for every store, the subclasses say which one
+    """
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+        self.sessions = SessionRegistry(self.store)
+
+    def _busy_session(self):
+        # a session halfway through a payload transfer, with timers armed
+        state = self.sessions.open(SID, NAMESPACE, seed=7, wire='binary')
+        state.sender.window_size = state.receiver.window_size = 4
+        state.sender.load(10)
+        state.outgoing = Segmenter(b'x' * 100, 10)
+        state.incoming = Reassembler(100, 10)
+        state.sent_at[1] = (time.time(), True)
+        state.timers.arm(1, 2.0, _noop)
+        self.sessions.save(state)
+        return state
+
+    def test_open_saves_the_session(self):
+        state = self.sessions.open(SID, NAMESPACE, wire='binary')
+        data = self.store.load(SessionRegistry._key(SID, NAMESPACE))
+        self.assertIsNotNone(data)
+        loaded = pickle.loads(data)
+        self.assertIsInstance(loaded, ArqSession)
+        self.assertEqual((loaded.sid, loaded.namespace, loaded.protocol, loaded.wire),
+                         (SID, NAMESPACE, 'go-back-N', 'binary'))
+        self.assertEqual(loaded.channel.seed, state.channel.seed)
+
+    def test_save_and_get_round_trip(self):
+        state = self._busy_session()
+        state.sender.on_ack(2)
+        self.sessions.save(state)
+        loaded = self.sessions.get(SID, NAMESPACE)
+        self.assertIsNot(loaded, state)
+        self.assertEqual((loaded.sender.base, loaded.sender.next_seq, loaded.sender.window_size),
+                         (3, state.sender.next_seq, 4))
+        self.assertEqual(loaded.wire, 'binary')
+
+    def test_local_parts_are_not_pickled(self):
+        self._busy_session()
+        loaded = pickle.loads(self.store.load(SessionRegistry._key(SID, NAMESPACE)))
+        self.assertEqual(len(loaded.timers), 0)
+        self.assertEqual(loaded.sent_at, {})
+        self.assertIsNone(loaded.outgoing)
+        self.assertIsNone(loaded.incoming)
+
+    def test_local_parts_stay_with_the_worker(self):
+        state = self._busy_session()
+        loaded = self.sessions.get(SID, NAMESPACE)
+        self.assertIs(loaded.timers, state.timers)
+        self.assertIs(loaded.sent_at, state.sent_at)
+        self.assertIs(loaded.outgoing, state.outgoing)
+        self.assertIs(loaded.incoming, state.incoming)
+        self.assertIn(1, loaded.timers)
+
+    def test_another_worker_rebuilds_local_parts(self):
+        self._busy_session()
+        other = SessionRegistry(self.store).get(SID, NAMESPACE)
+        self.assertEqual(other.sender.next_seq, 5)
+        self.assertEqual(len(other.timers), 0)
+        self.assertEqual(other.sent_at, {})
+        self.assertIsNone(other.outgoing)
+        self.assertIsNone(other.incoming)
+
+    def test_close_deletes_the_key(self):
+        state = self._busy_session()
+        self.sessions.close(SID, NAMESPACE)
+        self.assertIsNone(self.store.load(SessionRegistry._key(SID, NAMESPACE)))
+        self.assertEqual(len(state.timers), 0)
+        self.assertEqual(len(self.sessions), 0)
+
+    def test_get_after_close_elsewhere(self):
+        state = self._busy_session()
+        # another worker handled the disconnect
+        SessionRegistry(self.store).close(SID, NAMESPACE)
+        self.assertIsNone(self.sessions.get(SID, NAMESPACE, create=False))
+        self.assertIsNone(self.store.load(SessionRegistry._key(SID, NAMESPACE)))
+        self.assertEqual(len(state.timers), 0)
+        # an event of a connection it has not seen opens a fresh one
+        fresh = self.sessions.get(SID, NAMESPACE)
+        self.assertEqual(fresh.sender.next_seq, 1)
+        self.assertIsNotNone(self.store.load(SessionRegistry._key(SID, NAMESPACE)))
+
+
+class MemoryStoreTest(StoreRoundTrips, unittest.TestCase):
+
+    def make_store(self):
+        return MemoryStore()
+
+    def test_store_from_url(self):
+        self.assertIsNone(store_from_url(''))
+        self.assertIsInstance(store_from_url('memory'), MemoryStore)
+        with self.assertRaises(ValueError):
+            store_from_url('sqlite://')
+
+
+@unittest.skipIf(fakeredis is None, 'needs fakeredis')
+class RedisStoreTest(StoreRoundTrips, unittest.TestCase):
+
+    def make_store(self):
+        self.client = fakeredis.FakeStrictRedis()
+        self.client.flushall()
+        return RedisStore(client=self.client, ttl=1)
+
+    def test_keys_are_prefixed(self):
+        self.sessions.open(SID, NAMESPACE)
+        self.assertEqual(self.client.keys('*'), [b'arq:' + SessionRegistry._key(SID, NAMESPACE).encode()])
+
+    def test_ttl_expires_idle_sessions(self):
+        state = self._busy_session()
+        key = 'arq:' + SessionRegistry._key(SID, NAMESPACE)
+        self.assertTrue(0 < self.client.ttl(key) <= 1)
+        time.sleep(1.1)
+        self.assertIsNone(self.store.load(SessionRegistry._key(SID, NAMESPACE)))
+        # a timer that outlived its session does not bring it back
+        self.assertIsNone(self.sessions.get(SID, NAMESPACE, create=False))
+        self.assertEqual(self.client.keys('*'), [])
+        self.assertEqual(len(state.timers), 0)
+
+    def test_save_refreshes_the_ttl(self):
+        state = self.sessions.open(SID, NAMESPACE)
+        time.sleep(.6)
+        self.sessions.save(state)
+        time.sleep(.6)
+        self.assertIsNotNone(self.sessions.get(SID, NAMESPACE, create=False))
+
+
+if __name__ == '__main__':
+    unittest.main()